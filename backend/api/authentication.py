@@ -0,0 +1,37 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+User = get_user_model()
+
+
+def get_token_cache_key(key):
+    # Сам токен в ключ кэша не попадает
+    return f"auth-token:{hashlib.sha256(key.encode()).hexdigest()}"
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication, кэширующая соответствие токена и id активного
+    пользователя на TOKEN_CACHE_TTL секунд в общем кэше (CACHES).
+    При попадании в кэш запросов к базе нет: пользователь загружается
+    одним запросом, только если представлению нужны его поля
+    (FoodgramUser.from_cached_id), так что устаревший объект не затрет
+    счетчики и аватар.
+    Записи удаляются сигналами при выходе, удалении токена
+    и деактивации пользователя.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = get_token_cache_key(key)
+        user_id = cache.get(cache_key)
+        if user_id is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(cache_key, user.id, settings.TOKEN_CACHE_TTL)
+            return user, token
+        user = User.from_cached_id(user_id)
+        return user, Token(key=key, user=user)
@@ -0,0 +1,70 @@
+import hashlib
+
+from api.metrics import record_cache
+from django.db.models import Exists, OuterRef
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from recipes.models import UserSubscriptions
+
+# Поля, от которых зависит представление рецепта
+RECIPE_VERSION_FIELDS = (
+    "id",
+    "created_at",
+    "updated_at",
+    "is_favorited",
+    "is_in_shopping_cart",
+    "author_is_subscribed",
+    "author__username",
+    "author__first_name",
+    "author__last_name",
+    "author__email",
+    "author__avatar",
+)
+
+
+def get_recipe_versions(recipes, user):
+    """
+    Выборка полей, определяющих версию рецептов, без сериализации.
+    Ожидает набор, аннотированный RecipeQuerySet.with_user_flags.
+    """
+    if user.is_authenticated:
+        is_subscribed = Exists(UserSubscriptions.objects.filter(
+            user=user, author=OuterRef("author")
+        ))
+    else:
+        is_subscribed = Exists(UserSubscriptions.objects.none())
+    return recipes.prefetch_related(None).annotate(
+        author_is_subscribed=is_subscribed
+    ).values(*RECIPE_VERSION_FIELDS)
+
+
+def conditional_response(request, versions, *extra, last_modified=True):
+    """
+    Считаем ETag и Last-Modified по версиям рецептов.
+    Возвращаем ответ 304, если клиент уже получил эту версию,
+    иначе None и заголовки для итогового ответа.
+    Для списков last_modified=False: удаление рецепта не меняет
+    наибольшее время изменения, и If-Modified-Since вернул бы 304.
+    """
+    user = request.user
+    etag = '"{}"'.format(hashlib.sha256(repr(
+        (user.pk, [tuple(row.values()) for row in versions], extra)
+    ).encode()).hexdigest()[:32])
+    headers = {"ETag": etag}
+    if versions and last_modified and not user.is_authenticated:
+        # Признаки избранного и подписок не отражаются во времени
+        # изменения, поэтому Last-Modified отдаем только анонимам
+        last_modified = int(max(
+            row["updated_at"] for row in versions
+        ).timestamp())
+        headers["Last-Modified"] = http_date(last_modified)
+    else:
+        last_modified = None
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    record_cache("conditional_get", response is not None)
+    if response is not None:
+        for header, value in headers.items():
+            response[header] = value
+    return response, headers
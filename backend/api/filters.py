@@ -1,33 +1,94 @@
+from api.ingredient_index import ingredient_index
+from django import forms
+from django.conf import settings
 from django.db.models import Q
 from django_filters import rest_framework as filters
-from django_filters.filters import CharFilter, ModelMultipleChoiceFilter
+from django_filters.fields import BaseCSVField
+from django_filters.filters import (BaseInFilter, CharFilter,
+                                    ModelMultipleChoiceFilter, NumberFilter)
 from django_filters.rest_framework import BooleanFilter
 from recipes.models import Recipe, Tag
+from recipes.search import search_recipes
 from rest_framework.filters import BaseFilterBackend
 
 
 class IngredientSearchFilter(BaseFilterBackend):
-    """Кастомный фильтр для поиска ингредиентов"""
+    """
+    Кастомный фильтр для поиска ингредиентов.
+    Ищет по индексу в памяти процесса: сначала совпадения по началу
+    названия, затем по подстроке, без учета регистра и ё/е.
+    """
 
     search_param = 'name'
 
     def filter_queryset(self, request, queryset, view):
         search_term = request.query_params.get(self.search_param, '').strip()
+        if not search_term:
+            return queryset
+        if queryset.query.where:
+            # Выборка уже отфильтрована другими бэкендами,
+            # индекс по всему каталогу здесь неприменим
+            condition = Q(name__istartswith=search_term)
+            if len(search_term) >= settings.INGREDIENT_SUBSTRING_MIN_LENGTH:
+                condition |= Q(name__icontains=search_term)
+            return queryset.filter(condition)[
+                :settings.INGREDIENT_SEARCH_LIMIT
+            ]
+        return ingredient_index.search(search_term)
+
+
+class RecipeSearchFilter(BaseFilterBackend):
+    """
+    Полнотекстовый поиск рецептов по названию, описанию и ингредиентам
+    с сортировкой по релевантности.
+    """
+
+    search_param = 'search'
+
+    @classmethod
+    def get_search_term(cls, request):
+        return request.query_params.get(cls.search_param, '').strip()
+
+    @classmethod
+    def is_requested(cls, request):
+        """Запрошен ли поиск."""
+        return bool(cls.get_search_term(request))
+
+    def filter_queryset(self, request, queryset, view):
+        search_term = self.get_search_term(request)
         if search_term:
-            if search_term.isdigit():
-                # Если введена цифра, ищем по содержимому
-                return queryset.filter(Q(name__icontains=search_term))
-            else:
-                # Если введена буква, ищем по первой букве без учета регистра
-                return queryset.filter(
-                    Q(name__istartswith=search_term.lower())
-                )
+            return search_recipes(queryset, search_term)
         return queryset
 
 
+class LimitedCSVField(BaseCSVField):
+    """Список значений через запятую не длиннее max_values."""
+
+    def __init__(self, *args, max_values=None, **kwargs):
+        self.max_values = max_values
+        super().__init__(*args, **kwargs)
+
+    def clean(self, value):
+        if self.max_values and value and len(value) > self.max_values:
+            raise forms.ValidationError(
+                f"Не больше {self.max_values} значений.", code="max_values"
+            )
+        return super().clean(value)
+
+
+class NumberInFilter(BaseInFilter, NumberFilter):
+    """Список чисел через запятую."""
+
+    base_field_class = LimitedCSVField
+
+
 class RecipeFilter(filters.FilterSet):
     """Фильтр для рецептов."""
 
+    ids = NumberInFilter(
+        field_name="id", lookup_expr="in",
+        max_values=settings.RECIPES_BULK_MAX_IDS,
+    )
     author = CharFilter(field_name="author__id")
     tags = ModelMultipleChoiceFilter(
         field_name="tags__slug",
@@ -55,6 +116,7 @@ class RecipeFilter(filters.FilterSet):
     class Meta:
         model = Recipe
         fields = (
+            "ids",
             "author",
             "tags",
             "is_favorited",
@@ -0,0 +1,162 @@
+import threading
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from itertools import islice
+
+from api.metrics import record_cache
+from api.versions import CacheVersion
+from django.conf import settings
+from recipes.models import Ingredient
+
+# Разделитель строк в общем буфере ключей
+SEPARATOR = "\n"
+
+# Наибольшая длина n-грамм в индексе подстрок
+NGRAM_SIZE = 3
+
+
+def normalize(text):
+    """Приводим строку к виду для поиска без учета регистра и ё/е."""
+    return text.casefold().replace("ё", "е").replace(SEPARATOR, " ")
+
+
+def get_ngrams(text, sizes=range(1, NGRAM_SIZE + 1)):
+    """Подстроки text длиной sizes."""
+    return {
+        text[start:start + size]
+        for size in sizes
+        for start in range(len(text) - size + 1)
+    }
+
+
+class _Keys:
+    """Последовательность ключей поверх общего буфера для bisect."""
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self.blob[self.offsets[index]:self.offsets[index + 1] - 1]
+
+
+class IngredientIndex:
+    """
+    Префиксный индекс каталога ингредиентов в памяти процесса.
+    Нормализованные названия хранятся отсортированными в одной строке,
+    границы строк, id и единицы измерения — в компактных массивах.
+    Совпадения по префиксу ищутся бинарным поиском, по подстроке —
+    проверкой строк из самого короткого списка n-грамм запроса.
+    Версия индекса хранится в кэше (api.versions), как у снимков
+    справочников: invalidate в одном процессе перестраивает индекс
+    во всех, если кэш общий; иначе — не позже чем через ttl.
+    """
+
+    def __init__(self, ttl=None):
+        self.version = CacheVersion("ingredient-index-version", ttl)
+        self._lock = threading.Lock()
+        self._data = None
+
+    def invalidate(self):
+        """Меняем версию, индекс будет перестроен при следующем поиске."""
+        self._data = None
+        self.version.invalidate()
+
+    def _get_data(self):
+        version = self.version.get()
+        data = self._data
+        hit = data is not None and data[0] == version
+        record_cache("ingredient_index", hit)
+        if hit:
+            return data[1]
+        with self._lock:
+            data = self._data
+            if data is None or data[0] != version:
+                data = (version, self._build())
+                self._data = data
+        return data[1]
+
+    @staticmethod
+    def _build():
+        rows = sorted(
+            (normalize(name), name, pk, unit)
+            for pk, name, unit in Ingredient.objects.values_list(
+                "id", "name", "measurement_unit"
+            ).iterator()
+        )
+        units = []
+        unit_ids = {}
+        offsets = array("Q", [0])
+        ids = array("q")
+        row_units = array("L")
+        ngrams = defaultdict(lambda: array("L"))
+        for row, (key, _, pk, unit) in enumerate(rows):
+            for ngram in get_ngrams(key):
+                ngrams[ngram].append(row)
+            offsets.append(offsets[-1] + len(key) + 1)
+            ids.append(pk)
+            if unit not in unit_ids:
+                unit_ids[unit] = len(units)
+                units.append(unit)
+            row_units.append(unit_ids[unit])
+        keys = _Keys(
+            "".join(key + SEPARATOR for key, *_ in rows), offsets
+        )
+        names = [name for _, name, *_ in rows]
+        return keys, names, ids, row_units, units, dict(ngrams)
+
+    def search(self, term):
+        """
+        Ингредиенты, название которых начинается с term или содержит его,
+        не больше INGREDIENT_SEARCH_LIMIT. Совпадения по префиксу идут
+        раньше совпадений по подстроке; по подстроке ищется, только если
+        term не короче INGREDIENT_SUBSTRING_MIN_LENGTH.
+        """
+        term = normalize(term)
+        if not term:
+            return []
+        keys, names, ids, row_units, units, ngrams = self._get_data()
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+        start = bisect_left(keys, term)
+        end = min(start + limit, len(keys))
+        matches = []
+        for row in range(start, end):
+            if not keys[row].startswith(term):
+                break
+            matches.append(row)
+        if (
+            len(matches) < limit
+            and len(term) >= settings.INGREDIENT_SUBSTRING_MIN_LENGTH
+        ):
+            # Строки с подстрокой term есть в списке каждой n-граммы term,
+            # проверяем только строки самого короткого списка
+            candidates = min(
+                (
+                    ngrams.get(ngram, ())
+                    for ngram in get_ngrams(
+                        term, (min(len(term), NGRAM_SIZE),)
+                    )
+                ),
+                key=len
+            )
+            matches.extend(islice(
+                (row for row in candidates if keys[row].find(term) > 0),
+                limit - len(matches)
+            ))
+        return [
+            Ingredient(
+                id=ids[row],
+                name=names[row],
+                measurement_unit=units[row_units[row]]
+            )
+            for row in matches
+        ]
+
+
+ingredient_index = IngredientIndex(
+    ttl=getattr(settings, "INGREDIENT_INDEX_TTL", None)
+)
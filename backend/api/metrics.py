@@ -0,0 +1,231 @@
+"""
+Метрики приложения в текстовом формате Prometheus.
+
+Каждый процесс (воркер gunicorn) пишет значения в собственный файл,
+отображенный в память (mmap), в каталоге METRICS_DIR. Эндпоинт метрик
+читает и суммирует файлы всех процессов, поэтому агрегирование
+не требует внешнего сервиса. Каталог следует очищать при старте
+мастер-процесса.
+"""
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+# Границы корзин гистограммы задержек (в секундах)
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, float("inf")
+)
+
+METRICS = {
+    "foodgram_http_requests_total": (
+        "counter", "Количество HTTP-запросов."
+    ),
+    "foodgram_http_request_duration_seconds": (
+        "histogram", "Время обработки HTTP-запроса."
+    ),
+    "foodgram_db_queries_total": (
+        "counter", "Количество SQL-запросов."
+    ),
+    "foodgram_db_duration_seconds_total": (
+        "counter", "Суммарное время SQL-запросов."
+    ),
+    "foodgram_cache_requests_total": (
+        "counter", "Обращения к кэшам приложения (hit/miss)."
+    ),
+}
+
+
+class MmapedDict:
+    """
+    Словарь {ключ: число}, хранящийся в файле, отображенном в память.
+    Формат: 8 байт заголовка с занятым размером, далее записи
+    [4 байта длины ключа][ключ, выровненный до 8 байт][8 байт double].
+    Писать в файл должен только один процесс.
+    """
+
+    INITIAL_SIZE = 1 << 16
+    HEADER_SIZE = 8
+
+    def __init__(self, path):
+        self._file = open(path, "a+b")
+        capacity = os.fstat(self._file.fileno()).st_size
+        if capacity == 0:
+            capacity = self.INITIAL_SIZE
+            self._file.truncate(capacity)
+        self._capacity = capacity
+        self._mmap = mmap.mmap(self._file.fileno(), capacity)
+        self._positions = {}
+        self._used = struct.unpack_from("i", self._mmap, 0)[0]
+        if self._used == 0:
+            self._used = self.HEADER_SIZE
+            struct.pack_into("i", self._mmap, 0, self._used)
+        for key, _, position in self._read_entries(self._mmap, self._used):
+            self._positions[key] = position
+
+    @staticmethod
+    def _read_entries(data, used):
+        position = MmapedDict.HEADER_SIZE
+        while position < used:
+            length = struct.unpack_from("i", data, position)[0]
+            key_end = position + 4 + length
+            key = bytes(data[position + 4:key_end]).decode("utf-8")
+            value_position = key_end + (8 - key_end % 8) % 8
+            value = struct.unpack_from("d", data, value_position)[0]
+            yield key, value, value_position
+            position = value_position + 8
+
+    @classmethod
+    def read(cls, path):
+        """Читаем все значения из файла метрик."""
+        with open(path, "rb") as metrics_file:
+            data = metrics_file.read()
+        if len(data) < cls.HEADER_SIZE:
+            return
+        used = struct.unpack_from("i", data, 0)[0]
+        for key, value, _ in cls._read_entries(data, used):
+            yield key, value
+
+    def _add_key(self, key):
+        encoded = key.encode("utf-8")
+        key_end = self._used + 4 + len(encoded)
+        value_position = key_end + (8 - key_end % 8) % 8
+        end = value_position + 8
+        while end > self._capacity:
+            self._capacity *= 2
+            self._file.truncate(self._capacity)
+            self._mmap.close()
+            self._mmap = mmap.mmap(self._file.fileno(), self._capacity)
+        struct.pack_into("i", self._mmap, self._used, len(encoded))
+        self._mmap[self._used + 4:key_end] = encoded
+        struct.pack_into("d", self._mmap, value_position, 0.0)
+        self._used = end
+        struct.pack_into("i", self._mmap, 0, self._used)
+        self._positions[key] = value_position
+        return value_position
+
+    def increment(self, key, amount):
+        position = self._positions.get(key)
+        if position is None:
+            position = self._add_key(key)
+        value = struct.unpack_from("d", self._mmap, position)[0]
+        struct.pack_into("d", self._mmap, position, value + amount)
+
+
+class MetricsStore:
+    """Метрики текущего процесса в файле METRICS_DIR/metrics_<pid>.db."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = None
+        self._path = None
+
+    def _get_values(self):
+        # После fork у воркера свой pid и свой файл
+        path = os.path.join(settings.METRICS_DIR, f"metrics_{os.getpid()}.db")
+        if self._path != path:
+            os.makedirs(settings.METRICS_DIR, exist_ok=True)
+            self._values = MmapedDict(path)
+            self._path = path
+        return self._values
+
+    def increment(self, name, labels, amount=1):
+        key = json.dumps([name, labels], sort_keys=True, ensure_ascii=False)
+        with self._lock:
+            self._get_values().increment(key, amount)
+
+    def observe(self, name, labels, value):
+        """Добавляем наблюдение в гистограмму."""
+        # Корзины накопительные; пустые тоже создаем, чтобы набор
+        # корзин у всех серий был одинаковым
+        for bound in LATENCY_BUCKETS:
+            self.increment(
+                f"{name}_bucket", {**labels, "le": format_bound(bound)},
+                int(value <= bound)
+            )
+        self.increment(f"{name}_sum", labels, value)
+        self.increment(f"{name}_count", labels)
+
+    @staticmethod
+    def collect():
+        """Суммируем значения метрик всех процессов."""
+        totals = defaultdict(float)
+        pattern = os.path.join(settings.METRICS_DIR, "metrics_*.db")
+        for path in glob.glob(pattern):
+            for key, value in MmapedDict.read(path):
+                totals[key] += value
+        return totals
+
+
+def format_bound(bound):
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+
+def escape(value):
+    return (
+        str(value).replace("\\", "\\\\").replace("\n", "\\n")
+        .replace('"', '\\"')
+    )
+
+
+def sort_key(item):
+    # Корзины гистограммы упорядочиваем по возрастанию границы
+    name, labels, _ = item
+    return name, sorted(
+        (label, value) for label, value in labels.items() if label != "le"
+    ), float(labels.get("le", 0))
+
+
+def render(totals):
+    """Текстовый формат Prometheus."""
+    series = defaultdict(list)
+    for key, value in totals.items():
+        name, labels = json.loads(key)
+        base_name = name
+        for suffix in ("_bucket", "_sum", "_count"):
+            if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+                base_name = name[:-len(suffix)]
+        series[base_name].append((name, labels, value))
+    lines = []
+    for base_name in sorted(series):
+        metric_type, description = METRICS.get(
+            base_name, ("untyped", base_name)
+        )
+        lines.append(f"# HELP {base_name} {description}")
+        lines.append(f"# TYPE {base_name} {metric_type}")
+        for name, labels, value in sorted(series[base_name], key=sort_key):
+            label_text = ",".join(
+                f'{label}="{escape(label_value)}"'
+                for label, label_value in sorted(labels.items())
+            )
+            lines.append(f"{name}{{{label_text}}} {value!r}")
+    return "\n".join(lines) + "\n"
+
+
+metrics_store = MetricsStore()
+
+
+def record_cache(cache, hit):
+    """Учитываем попадание или промах кэша."""
+    if settings.METRICS_ENABLED:
+        metrics_store.increment(
+            "foodgram_cache_requests_total",
+            {"cache": cache, "result": "hit" if hit else "miss"}
+        )
+
+
+def metrics_view(request):
+    """Эндпоинт метрик для Prometheus."""
+    token = settings.METRICS_TOKEN
+    if token and request.META.get("HTTP_AUTHORIZATION") != f"Bearer {token}":
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render(metrics_store.collect()),
+        content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,150 @@
+import logging
+import time
+from collections import Counter
+
+from api.metrics import metrics_store
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger("api.sql")
+
+
+def get_view_name(view_func, request):
+    """
+    Имя представления вида RecipeViewSet.list: для вьюсетов DRF
+    с названием действия, для функций — имя функции.
+    """
+    view_class = getattr(view_func, "cls", None)
+    if view_class is None:
+        return f"{view_func.__module__}.{view_func.__name__}"
+    actions = getattr(view_func, "actions", None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f"{view_class.__name__}.{action}"
+
+
+class QueryStats:
+    """Счетчик SQL-запросов, подключаемый через execute_wrapper."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+
+    @property
+    def duration_ms(self):
+        return self.duration * 1000
+
+    @property
+    def duplicates(self):
+        """Повторяющиеся запросы: {sql: количество}."""
+        return {
+            sql: count for sql, count in self.statements.items() if count > 1
+        }
+
+
+class SQLInstrumentationMiddleware:
+    """
+    Считает количество SQL-запросов, время в базе и повторяющиеся
+    запросы для каждого запроса. Включается SQL_INSTRUMENTATION_ENABLED.
+
+    При SQL_INSTRUMENTATION_HEADERS добавляет заголовки Server-Timing
+    и X-DB-Queries; пишет в лог запросы, превысившие SQL_QUERY_BUDGET
+    или SQL_TIME_BUDGET_MS, и признаки N+1 — один и тот же запрос,
+    повторенный не менее SQL_N_PLUS_ONE_THRESHOLD раз.
+    Запросы, выполненные при потоковой отдаче ответа, не учитываются.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SQL_INSTRUMENTATION_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        request.sql_stats = stats
+        with connection.execute_wrapper(stats):
+            response = self.get_response(request)
+        view_name = getattr(request, "view_name", request.path)
+        self.check_budgets(request, view_name, stats)
+        if settings.SQL_INSTRUMENTATION_HEADERS:
+            response["X-DB-Queries"] = str(stats.count)
+            response["Server-Timing"] = (
+                f'db;dur={stats.duration_ms:.2f};desc="{stats.count} queries"'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.view_name = get_view_name(view_func, request)
+
+    @staticmethod
+    def check_budgets(request, view_name, stats):
+        if (
+            stats.count > settings.SQL_QUERY_BUDGET
+            or stats.duration_ms > settings.SQL_TIME_BUDGET_MS
+        ):
+            logger.warning(
+                "SQL budget exceeded: %s %s (%s): %d queries, %.1f ms",
+                request.method, request.path, view_name,
+                stats.count, stats.duration_ms
+            )
+        for sql, count in stats.duplicates.items():
+            if count >= settings.SQL_N_PLUS_ONE_THRESHOLD:
+                logger.warning(
+                    "Possible N+1 in %s (%s %s): query repeated %d times: %s",
+                    view_name, request.method, request.path, count, sql
+                )
+
+
+class MetricsMiddleware:
+    """
+    Собирает метрики запросов: количество по представлению, методу
+    и статусу, гистограмму задержек, число и время SQL-запросов.
+    Включается METRICS_ENABLED; метрики отдаются по адресу /metrics.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        stats = getattr(request, "sql_stats", None)
+        if stats is None:
+            stats = QueryStats()
+            request.sql_stats = stats
+            with connection.execute_wrapper(stats):
+                response = self.get_response(request)
+        else:
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+        view = getattr(request, "view_name", "unresolved")
+        metrics_store.increment("foodgram_http_requests_total", {
+            "view": view,
+            "method": request.method,
+            "status": str(response.status_code),
+        })
+        metrics_store.observe(
+            "foodgram_http_request_duration_seconds", {"view": view}, duration
+        )
+        metrics_store.increment(
+            "foodgram_db_queries_total", {"view": view}, stats.count
+        )
+        metrics_store.increment(
+            "foodgram_db_duration_seconds_total", {"view": view},
+            stats.duration
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.view_name = get_view_name(view_func, request)
@@ -1,8 +1,29 @@
 from django.conf import settings
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class FoodgramPagination(PageNumberPagination):
 
     page_size_query_param = "limit"
     page_size = settings.DEFAULT_PAGE_SIZE
+
+
+class FoodgramCursorPagination(CursorPagination):
+    """
+    Курсорная (keyset) пагинация по (-created_at, -id).
+    Не выполняет COUNT(*) и OFFSET, поэтому стоимость страницы
+    не зависит от её глубины.
+    """
+
+    page_size_query_param = "limit"
+    page_size = settings.DEFAULT_PAGE_SIZE
+    ordering = ("-created_at", "-id")
+
+    # Параметр запроса, включающий курсорную пагинацию: ?pagination=cursor
+    mode_query_param = "pagination"
+    mode = "cursor"
+
+    @classmethod
+    def is_requested(cls, request):
+        """Запрошена ли курсорная пагинация."""
+        return request.query_params.get(cls.mode_query_param) == cls.mode
@@ -1,34 +1,129 @@
+import csv
+import json
+from collections import defaultdict
 from datetime import datetime
 
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from recipes.models import Recipe
 
-def format_shopping_cart(ingredients, recipes):
+RECIPE_SHORT_FIELDS = ("id", "name", "image", "cooking_time", "author_id")
+
+
+def get_recipes_limit(request):
+    """Ограничение на количество рецептов из параметра recipes_limit."""
+    try:
+        recipes_limit = int(request.query_params.get("recipes_limit"))
+    except (TypeError, ValueError):
+        return None
+    return recipes_limit if recipes_limit > 0 else None
+
+
+def set_prefetched(instance, name, objects):
+    """
+    Кладем объекты в кэш prefetch_related связи name так же,
+    как это делает Django, чтобы сериализатор не загружал их заново.
+    """
+    cache = instance.__dict__.setdefault("_prefetched_objects_cache", {})
+    cache.pop(name, None)
+    queryset = getattr(instance, name).get_queryset()
+    queryset._result_cache = list(objects)
+    queryset._prefetch_done = True
+    cache[name] = queryset
+
+
+def get_authors_recipes(author_ids, recipes_limit=None):
+    """
+    Первые recipes_limit рецептов каждого автора одним запросом.
+    Рецепты нумеруются ROW_NUMBER() в пределах автора, внешний запрос
+    отбирает первые N строк. Возвращает словарь {author_id: [рецепты]}.
+    """
+    author_ids = set(author_ids)
+    authors_recipes = defaultdict(list)
+    if not author_ids:
+        return authors_recipes
+    recipes = Recipe.objects.filter(author_id__in=author_ids).order_by(
+        "author_id", "-created_at", "-id"
+    ).only(*RECIPE_SHORT_FIELDS)
+    if recipes_limit:
+        ranked = recipes.annotate(row_number=Window(
+            expression=RowNumber(),
+            partition_by=[F("author_id")],
+            order_by=[F("created_at").desc(), F("id").desc()],
+        )).order_by().values(*RECIPE_SHORT_FIELDS, "row_number")
+        sql, params = ranked.query.sql_with_params()
+        columns = ", ".join(RECIPE_SHORT_FIELDS)
+        recipes = Recipe.objects.raw(
+            f"SELECT {columns} FROM ({sql}) ranked "
+            f"WHERE row_number <= %s ORDER BY author_id, row_number",
+            (*params, recipes_limit),
+        )
+    for recipe in recipes:
+        authors_recipes[recipe.author_id].append(recipe)
+    return authors_recipes
+
+
+def shopping_cart_txt(ingredients, recipes, date):
     """
-    Формирование строки для файла со списком покупок.
+    Построчное формирование файла со списком покупок.
     Добавлены дата, нумерация продуктов, заголовки и список рецептов.
     """
-    # Получение текущей даты
-    current_date = datetime.now().strftime('%Y-%m-%d')
-
-    # Проверка структуры входных данных
-    if not ingredients or not recipes:
-        return f"Список покупок пуст на {current_date}."
-
-    # Заголовки и нумерация продуктов
-    ingredients = [
-        f"{index}. {item['ingredient__name'].capitalize()} – "
-        f"{item['amount']} {item['ingredient__measurement_unit']}"
-        for index, item in enumerate(ingredients, 1)
-    ]
-
-    # Перечень рецептов
-    recipes = [f"- {recipe.name}" for recipe in recipes]
-
-    # Составляем и возвращаем весь отчет
-    return '\n'.join([
-        f"Список покупок на {current_date}:",
-        "Продукты:",
-        *ingredients,
-        "",
-        "Рецепты:",
-        *recipes
-    ])
+    yield f"Список покупок на {date}:\n"
+    yield "Продукты:\n"
+    for index, item in enumerate(ingredients, 1):
+        yield (
+            f"{index}. {item['ingredient__name'].capitalize()} – "
+            f"{item['amount']} {item['ingredient__measurement_unit']}\n"
+        )
+    yield "\n"
+    yield "Рецепты:\n"
+    for name in recipes:
+        yield f"- {name}\n"
+
+
+class _Echo:
+    """Псевдобуфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def shopping_cart_csv(ingredients, recipes, date):
+    """Построчное формирование списка покупок в формате CSV."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(("name", "measurement_unit", "amount"))
+    for item in ingredients:
+        yield writer.writerow((
+            item["ingredient__name"],
+            item["ingredient__measurement_unit"],
+            item["amount"],
+        ))
+
+
+def shopping_cart_json(ingredients, recipes, date):
+    """Потоковое формирование списка покупок в формате JSON."""
+    yield f'{{"date": {json.dumps(date)}, "ingredients": ['
+    for index, item in enumerate(ingredients):
+        yield ("," if index else "") + json.dumps({
+            "name": item["ingredient__name"],
+            "measurement_unit": item["ingredient__measurement_unit"],
+            "amount": item["amount"],
+        }, ensure_ascii=False)
+    yield '], "recipes": ['
+    for index, name in enumerate(recipes):
+        yield ("," if index else "") + json.dumps(name, ensure_ascii=False)
+    yield "]}"
+
+
+SHOPPING_CART_EXPORTERS = {
+    "txt": shopping_cart_txt,
+    "csv": shopping_cart_csv,
+    "json": shopping_cart_json,
+}
+
+
+def export_shopping_cart(export_format, ingredients, recipes):
+    """Генератор содержимого файла со списком покупок в нужном формате."""
+    return SHOPPING_CART_EXPORTERS[export_format](
+        ingredients, recipes, datetime.now().strftime('%Y-%m-%d')
+    )
@@ -0,0 +1,42 @@
+import json
+
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class QueryFormatNegotiation(DefaultContentNegotiation):
+    """
+    Выбор формата только по параметру ?format=, без учета Accept.
+    Без параметра используется первый рендерер.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        format_query_param = self.settings.URL_FORMAT_OVERRIDE
+        requested_format = format_suffix or request.query_params.get(
+            format_query_param
+        )
+        if requested_format:
+            renderers = self.filter_renderers(renderers, requested_format)
+        return renderers[0], renderers[0].media_type
+
+
+class DownloadRenderer(BaseRenderer):
+    """Рендерер файлов для скачивания; ошибки отдаются в виде JSON."""
+
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+
+class PlainTextRenderer(DownloadRenderer):
+    media_type = "text/plain"
+    format = "txt"
+
+
+class CSVRenderer(DownloadRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+
+SHOPPING_CART_RENDERERS = (PlainTextRenderer, CSVRenderer, JSONRenderer)
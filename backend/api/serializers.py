@@ -1,22 +1,88 @@
+from api.recipes_utils import (get_authors_recipes, get_recipes_limit,
+                               set_prefetched)
+from api.subscriptions_utils import SubscribedListSerializer, is_subscribed
+from api.uploads import validate_image_upload
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
 from django.db import transaction
 from djoser.serializers import UserCreateSerializer as DjoserUserSerializer
 from drf_extra_fields.fields import Base64ImageField
 from recipes.constants import MIN_AMOUNT
+from recipes.images import ORIGINAL, WEBP, get_variant_url
 from recipes.models import (Ingredient, Recipe, RecipeIngredient, Tag,
                             UserFavorite, UserShoppingList, UserSubscriptions)
+from recipes.search import SEARCH_DOCUMENT_FIELDS, update_search_documents
+from recipes.shopping_cart import update_recipe_in_carts
 from rest_framework import serializers
 
 User = get_user_model()
 
 
+class ImageVariantField(serializers.ImageField):
+    """
+    Ссылка на картинку в размере из параметра запроса image_size
+    (см. IMAGE_SIZES) и в WebP при image_format=webp.
+    По умолчанию — ссылка на оригинал.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        request = self.context.get("request")
+        size = ORIGINAL
+        image_format = ORIGINAL
+        if request is not None:
+            size = request.query_params.get("image_size", ORIGINAL)
+            if size not in settings.IMAGE_SIZES:
+                size = ORIGINAL
+            if request.query_params.get("image_format") == WEBP:
+                image_format = WEBP
+        url = get_variant_url(value, size, image_format)
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+
+class ImageUploadField(Base64ImageField):
+    """
+    Картинка строкой base64 в JSON или файлом в multipart/form-data.
+    Размер и количество пикселей проверяются до декодирования картинки.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            validate_image_upload(data)
+            return serializers.ImageField.to_internal_value(self, data)
+        # Длина base64 на треть больше файла: отсекаем до декодирования
+        if (
+            isinstance(data, str)
+            and len(data) * 3 // 4 > settings.IMAGE_UPLOAD_MAX_SIZE
+        ):
+            raise serializers.ValidationError(
+                "Размер изображения не должен превышать "
+                f"{settings.IMAGE_UPLOAD_MAX_SIZE // (1024 * 1024)} MB."
+            )
+        image = super().to_internal_value(data)
+        if image:
+            validate_image_upload(image)
+        return image
+
+
 class UserSerializer(DjoserUserSerializer):
     """
     Модифицированный сериализатор пользователя, добавляющий поле is_subscribed.
     """
 
     is_subscribed = serializers.SerializerMethodField()
+    avatar = ImageVariantField()
+
+    author_id_field = "id"
 
     class Meta:
         model = User
@@ -24,23 +90,19 @@ class UserSerializer(DjoserUserSerializer):
             "is_subscribed",
             "avatar",
         )
+        list_serializer_class = SubscribedListSerializer
 
     def get_is_subscribed(self, user):
         """
         Проверяем, подписан ли текущий пользователь на данного пользователя.
         """
-        request = self.context.get("request")
-        if not request or not request.user.is_authenticated:
-            return False
-        return UserSubscriptions.objects.filter(
-            user=request.user, author=user
-        ).exists()
+        return is_subscribed(self.context, user.id)
 
 
 class AvatarSerializer(serializers.ModelSerializer):
     """Сериализатор для изменения аватара пользователя."""
 
-    avatar = Base64ImageField(required=False)
+    avatar = ImageUploadField(required=False)
 
     class Meta:
         model = User
@@ -87,6 +149,9 @@ class RecipeSerializer(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image = ImageVariantField()
+
+    author_id_field = "author_id"
 
     class Meta:
         model = Recipe
@@ -94,32 +159,77 @@ class RecipeSerializer(serializers.ModelSerializer):
             "id", "tags", "author", "ingredients", "name", "image", "text",
             "cooking_time", "is_favorited", "is_in_shopping_cart"
         )
+        list_serializer_class = SubscribedListSerializer
 
     def get_is_favorited(self, recipe):
         """Проверяем, есть ли рецепт в избранном пользователя."""
-        request = self.context.get("request")
-        if not request or not request.user.is_authenticated:
-            return False
-        return UserFavorite.objects.filter(
-            user=request.user,
-            recipe=recipe
-        ).exists()
+        return self._get_user_flag(recipe, "is_favorited", UserFavorite)
 
     def get_is_in_shopping_cart(self, recipe):
         """Проверяем, есть ли рецепт в списке покупок пользователя."""
+        return self._get_user_flag(
+            recipe, "is_in_shopping_cart", UserShoppingList
+        )
+
+    def _get_user_flag(self, recipe, name, model):
+        """
+        Читаем признак, аннотированный в RecipeQuerySet.with_user_flags,
+        и обращаемся к базе только если рецепт загружен без аннотации.
+        """
+        flag = getattr(recipe, name, None)
+        if flag is not None:
+            return flag
         request = self.context.get("request")
         if not request or not request.user.is_authenticated:
             return False
-        return UserShoppingList.objects.filter(
-            user=request.user,
-            recipe=recipe
-        ).exists()
+        return model.objects.filter(user=request.user, recipe=recipe).exists()
+
+
+class RecipeShortSerializer(serializers.ModelSerializer):
+    """Краткий сериализатор рецепта для списка подписок."""
+
+    image = ImageVariantField()
+
+    class Meta:
+        model = Recipe
+        fields = ("id", "name", "image", "cooking_time")
+
+
+class BulkPrimaryKeyRelatedField(serializers.ListField):
+    """
+    Список первичных ключей, как PrimaryKeyRelatedField(many=True),
+    но объекты загружаются одним запросом, а не запросом на ключ.
+    """
+
+    default_error_messages = {
+        "does_not_exist": serializers.PrimaryKeyRelatedField
+        .default_error_messages["does_not_exist"],
+    }
+
+    def __init__(self, queryset, **kwargs):
+        self.queryset = queryset
+        super().__init__(child=serializers.IntegerField(), **kwargs)
+
+    def to_internal_value(self, data):
+        pks = super().to_internal_value(data)
+        objects = self.queryset.in_bulk(pks)
+        for pk in pks:
+            if pk not in objects:
+                self.fail("does_not_exist", pk_value=pk)
+        return [objects[pk] for pk in pks]
+
+    def to_representation(self, value):
+        return [obj.pk for obj in value.all()]
 
 
 class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
-    """Сериализатор для создания ингредиентов в рецептах."""
+    """
+    Сериализатор для создания ингредиентов в рецептах.
+    Существование ингредиентов проверяется одним запросом
+    в RecipeCreateUpdateSerializer.validate_ingredients.
+    """
 
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField(source="ingredient_id")
 
     class Meta:
         model = RecipeIngredient
@@ -127,15 +237,17 @@ class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
 
 
 class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
-    """Сериализатор для создания и обновления рецептов."""
+    """
+    Сериализатор для создания и обновления рецептов.
+    Теги и ингредиенты записываются разницей с текущими, а ответ
+    строится из записанных объектов без повторной загрузки.
+    """
 
-    image = Base64ImageField()
+    image = ImageUploadField()
     ingredients = RecipeIngredientCreateSerializer(
         many=True, source="recipeingredients"
     )
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(), many=True
-    )
+    tags = BulkPrimaryKeyRelatedField(queryset=Tag.objects.all())
 
     class Meta:
         model = Recipe
@@ -157,25 +269,33 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
             raise ValidationError(
                 "Файл должен быть изображением формата JPEG или PNG."
             )
-        if value.size > 5 * 1024 * 1024:
-            raise ValidationError(
-                "Размер изображения не должен превышать 5 MB."
-            )
         return value
 
     @staticmethod
     def validate_ingredients(ingredients):
-        """Проверка на наличие повторяющихся ингредиентов."""
-        ingredient_ids = [ingredient['id'] for ingredient in ingredients]
+        """
+        Проверка на наличие повторяющихся и несуществующих ингредиентов.
+        """
+        ingredient_ids = [
+            ingredient['ingredient_id'] for ingredient in ingredients
+        ]
         if len(ingredient_ids) != len(set(ingredient_ids)):
             duplicated_ingredients = [
-                ingredient['id'] for ingredient in ingredients
-                if ingredient_ids.count(ingredient['id']) > 1
+                ingredient_id for ingredient_id in ingredient_ids
+                if ingredient_ids.count(ingredient_id) > 1
             ]
             raise ValidationError(
                 f"Ингредиенты не должны повторяться. Повторяющиеся: "
                 f"{set(duplicated_ingredients)}."
             )
+        missing_ingredients = set(ingredient_ids).difference(
+            Ingredient.objects.filter(id__in=ingredient_ids).order_by(
+            ).values_list("id", flat=True)
+        )
+        if missing_ingredients:
+            raise ValidationError(
+                f"Ингредиенты не существуют: {missing_ingredients}."
+            )
         return ingredients
 
     @staticmethod
@@ -194,7 +314,7 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         """Проверка на корректные значения количества ингредиентов."""
         invalid_ingredients = [
             (
-                ingredient['id'], ingredient['amount']
+                ingredient['ingredient_id'], ingredient['amount']
             ) for ingredient in ingredients
             if ingredient['amount'] < MIN_AMOUNT
         ]
@@ -219,36 +339,129 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(
             **validated_data, author=self.context["request"].user, image=image
         )
-        recipe.tags.set(tags)
-        self.add_ingredients_to_recipe(recipe, ingredients)
+        # У нового рецепта нет тегов и ингредиентов,
+        # и его еще нет в списках покупок
+        set_prefetched(recipe, "tags", ())
+        set_prefetched(recipe, "recipeingredients", ())
+        self.set_tags(recipe, tags)
+        self.set_ingredients(recipe, ingredients, in_carts=False)
+        update_search_documents((recipe.id,))
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop("recipeingredients", [])
-        tags = validated_data.pop("tags")
-        image = validated_data.pop("image", None)
-
-        instance.tags.clear()
-        instance.tags.set(tags)
-        RecipeIngredient.objects.filter(recipe=instance).delete()
-        self.add_ingredients_to_recipe(instance, ingredients)
-
         # Обновление изображения
-        if image:
-            instance.image = image
-
-        return super().update(instance, validated_data)
+        if not validated_data.get("image"):
+            validated_data.pop("image", None)
+        # Теги и ингредиенты записываются разницей до сохранения рецепта,
+        # которое обновляет время изменения. Сохраняются только
+        # изменившиеся поля; без изменений рецепт не сохраняется
+        relations_changed = False
+        ingredients_replaced = False
+        if "tags" in validated_data:
+            relations_changed |= self.set_tags(
+                instance, validated_data.pop("tags")
+            )
+        if "recipeingredients" in validated_data:
+            ingredients = validated_data.pop("recipeingredients")
+            old_ids = {
+                item.ingredient_id
+                for item in instance.recipeingredients.all()
+            }
+            relations_changed |= self.set_ingredients(instance, ingredients)
+            ingredients_replaced = old_ids != {
+                ingredient["ingredient_id"] for ingredient in ingredients
+            }
+        changed_fields = {
+            name for name, value in validated_data.items()
+            if getattr(instance, name) != value
+        }
+        for name in changed_fields:
+            setattr(instance, name, validated_data[name])
+        if changed_fields or relations_changed:
+            instance.save(update_fields=(*changed_fields, "updated_at"))
+        # Новые название или описание в документ запишет сигнал сохранения
+        if ingredients_replaced and not (
+            changed_fields & SEARCH_DOCUMENT_FIELDS
+        ):
+            update_search_documents((instance.id,))
+        return instance
 
     @staticmethod
-    def add_ingredients_to_recipe(recipe, ingredients):
-        """Добавление ингредиентов к рецепту с валидацией значений."""
-        RecipeIngredient.objects.bulk_create(
-            RecipeIngredient(
-                ingredient=ingredient["id"], amount=ingredient["amount"],
-                recipe=recipe
-            ) for ingredient in ingredients
+    def set_tags(recipe, tags):
+        """
+        Записываем разницу тегов через промежуточную модель.
+        Сигнал m2m_changed не нужен: время изменения обновит
+        сохранение рецепта. Возвращаем, изменились ли теги.
+        """
+        old_ids = {tag.id for tag in recipe.tags.all()}
+        new_ids = {tag.id for tag in tags}
+        RecipeTag = Recipe.tags.through
+        if old_ids - new_ids:
+            RecipeTag.objects.filter(
+                recipe=recipe, tag_id__in=old_ids - new_ids
+            ).delete()
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag_id=tag_id)
+            for tag_id in new_ids - old_ids
         )
+        set_prefetched(recipe, "tags", tags)
+        return old_ids != new_ids
+
+    @staticmethod
+    def set_ingredients(recipe, ingredients, in_carts=True):
+        """
+        Записываем разницу ингредиентов: удаление, добавление
+        и изменение количеств — не больше запроса на каждое,
+        и переносим ее в списки покупок. Возвращаем, была ли разница.
+        """
+        old_items = {
+            item.ingredient_id: item
+            for item in recipe.recipeingredients.all()
+        }
+        old_amounts = {
+            ingredient_id: item.amount
+            for ingredient_id, item in old_items.items()
+        }
+        new_amounts = {
+            ingredient["ingredient_id"]: ingredient["amount"]
+            for ingredient in ingredients
+        }
+        removed = old_amounts.keys() - new_amounts.keys()
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        items = []
+        created = []
+        changed = []
+        for ingredient_id, amount in new_amounts.items():
+            item = old_items.get(ingredient_id)
+            if item is None:
+                item = RecipeIngredient(
+                    recipe=recipe, ingredient_id=ingredient_id, amount=amount
+                )
+                created.append(item)
+            elif item.amount != amount:
+                item.amount = amount
+                changed.append(item)
+            items.append(item)
+        RecipeIngredient.objects.bulk_create(created)
+        RecipeIngredient.objects.bulk_update(changed, ("amount",))
+        if in_carts:
+            update_recipe_in_carts(recipe.id, old_amounts, new_amounts)
+        set_prefetched(recipe, "recipeingredients", items)
+        return bool(removed or created or changed)
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для пакетных действий."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.RECIPES_BULK_MAX_IDS,
+    )
 
 
 class SubscriptionsSerializer(serializers.ModelSerializer):
@@ -259,11 +472,11 @@ class SubscriptionsSerializer(serializers.ModelSerializer):
     first_name = serializers.ReadOnlyField(source='author.first_name')
     last_name = serializers.ReadOnlyField(source='author.last_name')
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(
-        source="author.recipes.count", read_only=True
-    )
+    recipes_count = serializers.ReadOnlyField(source="author.recipes_count")
     is_subscribed = serializers.SerializerMethodField()
 
+    author_id_field = "author_id"
+
     class Meta:
         model = UserSubscriptions
         fields = (
@@ -275,37 +488,28 @@ class SubscriptionsSerializer(serializers.ModelSerializer):
             "recipes_count",
             "is_subscribed",
         )
+        list_serializer_class = SubscribedListSerializer
 
     def get_recipes(self, subscription):
         """
         Получаем рецепты автора, на которого подписан пользователь.
+        Рецепты всех авторов страницы загружаются заранее во вьюсете
+        и передаются в контексте author_recipes.
         """
-        # Получаем ограничение на количество рецептов, если указано
-        recipes_limit = self.context["request"].query_params.get(
-            "recipes_limit"
-        )
-        try:
-            recipes_limit = int(recipes_limit)
-        except (TypeError, ValueError):
-            recipes_limit = None
-
-        # Получаем рецепты автора (subscription.author)
-        recipes = subscription.author.recipes.all()
-        if recipes_limit:
-            recipes = recipes[:recipes_limit]
-
-        # Сериализуем и возвращаем рецепты автора
-        return RecipeSerializer(recipes, many=True, context=self.context).data
+        authors_recipes = self.context.get("author_recipes")
+        if authors_recipes is None:
+            authors_recipes = get_authors_recipes(
+                (subscription.author_id,),
+                get_recipes_limit(self.context["request"])
+            )
+        return RecipeShortSerializer(
+            authors_recipes[subscription.author_id],
+            many=True,
+            context=self.context
+        ).data
 
     def get_is_subscribed(self, subscription):
         """
         Проверяем, подписан ли текущий пользователь на автора.
         """
-        request = self.context.get("request")
-        if not request or not request.user.is_authenticated:
-            return False
-
-        # Проверка наличия подписки на автора
-        return UserSubscriptions.objects.filter(
-            user=request.user, author=subscription.author
-        ).exists()
+        return is_subscribed(self.context, subscription.author_id)
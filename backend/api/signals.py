@@ -0,0 +1,183 @@
+from api.authentication import get_token_cache_key
+from api.ingredient_index import ingredient_index
+from api.snapshots import ingredients_snapshot, tags_snapshot
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete,
+                                      post_migrate, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+from recipes.counters import change_counters
+from recipes.images import schedule_variants
+from recipes.media import (change_refcount, get_media_names,
+                           get_saved_media_names)
+from recipes.models import (FoodgramUser, Ingredient, Recipe, Tag,
+                            UserFavorite, UserShoppingList,
+                            UserSubscriptions)
+from recipes.search import (SEARCH_DOCUMENT_FIELDS, create_search_schema,
+                            delete_search_documents, update_search_documents)
+from recipes.shopping_cart import add_recipe_to_cart
+from recipes.user_lists import in_bulk_change
+from rest_framework.authtoken.models import Token
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    """Сбрасываем индекс ингредиентов при изменении каталога."""
+    ingredient_index.invalidate()
+    ingredients_snapshot.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags_snapshot(**kwargs):
+    """Сбрасываем снимок тегов при их изменении."""
+    tags_snapshot.invalidate()
+
+
+@receiver(post_migrate)
+def create_recipe_search_schema(sender, **kwargs):
+    """Создаем таблицу полнотекстового поиска после миграций."""
+    if sender.name == "recipes":
+        create_search_schema()
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_document(instance, update_fields, **kwargs):
+    """Обновляем поисковый документ рецепта, если изменились его поля."""
+    if update_fields is None or update_fields & SEARCH_DOCUMENT_FIELDS:
+        update_search_documents((instance.id,))
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_recipe_search_document(instance, **kwargs):
+    """Удаляем поисковый документ рецепта."""
+    delete_search_documents((instance.id,))
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_search_documents(instance, created, **kwargs):
+    """Обновляем документы рецептов с переименованным ингредиентом."""
+    if not created:
+        update_search_documents(
+            instance.recipes.values_list("id", flat=True)
+        )
+        instance.recipes.touch()
+
+
+@receiver(post_save, sender=Tag)
+def touch_tag_recipes(instance, created, **kwargs):
+    """Отмечаем рецепты с измененным тегом."""
+    if not created:
+        instance.recipes.touch()
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def touch_recipe_on_tags_change(instance, action, reverse, pk_set, **kwargs):
+    """Отмечаем рецепты, у которых изменились теги."""
+    if reverse and action == "pre_clear":
+        instance.recipes.touch()
+    elif action in ("post_add", "post_remove", "post_clear"):
+        if not reverse:
+            Recipe.objects.filter(pk=instance.pk).touch()
+        elif pk_set:
+            Recipe.objects.filter(pk__in=pk_set).touch()
+
+
+@receiver(post_save, sender=UserShoppingList)
+def add_to_shopping_cart_ingredients(instance, created, **kwargs):
+    """Добавляем ингредиенты рецепта в суммарный список покупок."""
+    if created:
+        add_recipe_to_cart(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=UserShoppingList)
+def remove_from_shopping_cart_ingredients(instance, **kwargs):
+    """
+    Вычитаем ингредиенты рецепта из суммарного списка покупок.
+    pre_delete срабатывает до каскадного удаления ингредиентов рецепта.
+    """
+    if not in_bulk_change(instance):
+        add_recipe_to_cart(instance.user_id, instance.recipe_id, sign=-1)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=UserFavorite)
+@receiver(post_save, sender=UserSubscriptions)
+def increment_counters(instance, created, **kwargs):
+    """Увеличиваем счетчики при создании рецепта, избранного, подписки."""
+    if created:
+        change_counters(instance, 1)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=UserFavorite)
+@receiver(post_delete, sender=UserSubscriptions)
+def decrement_counters(instance, **kwargs):
+    """Уменьшаем счетчики при удалении рецепта, избранного, подписки."""
+    if not in_bulk_change(instance):
+        change_counters(instance, -1)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(instance, **kwargs):
+    """Выход через auth/token/logout удаляет токен."""
+    cache.delete(get_token_cache_key(instance.key))
+
+
+@receiver(post_save, sender=FoodgramUser)
+def invalidate_inactive_user_tokens(instance, update_fields, **kwargs):
+    """Токены деактивированного пользователя перестают приниматься."""
+    if instance.is_active or (
+        update_fields is not None and "is_active" not in update_fields
+    ):
+        return
+    cache.delete_many([
+        get_token_cache_key(key)
+        for key in Token.objects.filter(user=instance).values_list(
+            "key", flat=True
+        )
+    ])
+
+
+@receiver(post_save, sender=Recipe)
+def generate_recipe_image_variants(instance, update_fields, **kwargs):
+    """Уменьшенные копии картинки рецепта после сохранения."""
+    if update_fields is None or "image" in update_fields:
+        transaction.on_commit(lambda: schedule_variants(instance.image))
+
+
+@receiver(post_save, sender=FoodgramUser)
+def generate_avatar_variants(instance, update_fields, **kwargs):
+    """Уменьшенные копии аватара после сохранения."""
+    if instance.avatar and update_fields != frozenset({"last_login"}):
+        transaction.on_commit(lambda: schedule_variants(instance.avatar))
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=FoodgramUser)
+def remember_media_names(instance, update_fields, **kwargs):
+    """Запоминаем прежние имена файлов, чтобы учесть замену."""
+    instance._media_names = get_saved_media_names(instance, update_fields)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=FoodgramUser)
+def update_media_refcounts(instance, created, **kwargs):
+    """Переносим ссылку со старого файла на новый."""
+    old_names = instance.__dict__.pop("_media_names", {})
+    new_names = get_media_names(instance)
+    for field_name, name in new_names.items():
+        if created:
+            change_refcount(name, 1)
+        # Поле не сохранялось или было отложено при загрузке
+        elif field_name in old_names and name != old_names[field_name]:
+            change_refcount(old_names[field_name], -1)
+            change_refcount(name, 1)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=FoodgramUser)
+def release_media(instance, **kwargs):
+    """Освобождаем файлы удаленного объекта."""
+    for name in get_media_names(instance).values():
+        change_refcount(name, -1)
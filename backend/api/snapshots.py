@@ -0,0 +1,104 @@
+import gzip
+import hashlib
+import threading
+
+from api.metrics import record_cache
+from api.serializers import IngredientSerializer, TagSerializer
+from api.versions import CacheVersion
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from recipes.models import Ingredient, Tag
+from rest_framework.renderers import JSONRenderer
+
+
+class Snapshot:
+    """
+    Сериализованный список, его gzip-версия и их ETag. ETag сильные,
+    поэтому у сжатого тела свой: валидатор относится к байтам ответа.
+    """
+
+    def __init__(self, version, body):
+        self.version = version
+        self.body = body
+        self.gzip_body = gzip.compress(body, mtime=0)
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gzip"'
+
+
+class ReferenceSnapshot:
+    """
+    Заранее сериализованный справочник (теги, ингредиенты).
+    Снимок строится один раз для версии данных; версия хранится в общем
+    кэше (api.versions) и меняется сигналами при изменении модели.
+    """
+
+    def __init__(self, name, queryset, serializer_class):
+        self.name = name
+        self.queryset = queryset
+        self.serializer_class = serializer_class
+        self.version = CacheVersion(
+            f"snapshot-version:{name}", settings.REFERENCE_SNAPSHOT_TTL
+        )
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def get_version(self):
+        return self.version.get()
+
+    def invalidate(self):
+        """Меняем версию, снимок будет перестроен при следующем запросе."""
+        self.version.invalidate()
+
+    def get(self):
+        version = self.get_version()
+        snapshot = self._snapshot
+        hit = snapshot is not None and snapshot.version == version
+        record_cache(f"snapshot:{self.name}", hit)
+        if not hit:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or snapshot.version != version:
+                    data = self.serializer_class(
+                        self.queryset.all(), many=True
+                    ).data
+                    snapshot = Snapshot(
+                        version, JSONRenderer().render(data)
+                    )
+                    self._snapshot = snapshot
+        return snapshot
+
+    def response(self, request):
+        """Ответ со снимком: 304 по If-None-Match, gzip по запросу."""
+        snapshot = self.get()
+        use_gzip = "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", "")
+        etag = snapshot.gzip_etag if use_gzip else snapshot.etag
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(
+                snapshot.gzip_body if use_gzip else snapshot.body,
+                content_type="application/json"
+            )
+            if use_gzip:
+                response["Content-Encoding"] = "gzip"
+        response["ETag"] = etag
+        patch_vary_headers(response, ("Accept-Encoding",))
+        return response
+
+
+class SnapshotListMixin:
+    """Отдаёт нефильтрованный список из снимка справочника."""
+
+    snapshot = None
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params:
+            return super().list(request, *args, **kwargs)
+        return self.snapshot.response(request)
+
+
+tags_snapshot = ReferenceSnapshot("tags", Tag.objects.all(), TagSerializer)
+ingredients_snapshot = ReferenceSnapshot(
+    "ingredients", Ingredient.objects.all(), IngredientSerializer
+)
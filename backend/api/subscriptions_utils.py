@@ -0,0 +1,73 @@
+from django.db import models
+from recipes.models import UserSubscriptions
+from rest_framework import serializers
+
+
+class SubscriptionResolver:
+    """
+    Подписки текущего пользователя в рамках одного запроса.
+    Загружает за один запрос, на кого из авторов страницы
+    подписан пользователь.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.loaded_ids = set()
+        self.subscribed_ids = set()
+
+    @classmethod
+    def for_request(cls, request):
+        """Возвращает резолвер, привязанный к запросу."""
+        resolver = getattr(request, "_subscription_resolver", None)
+        if resolver is None:
+            resolver = cls(request.user)
+            request._subscription_resolver = resolver
+        return resolver
+
+    def prime(self, author_ids):
+        """Загружаем подписки на ещё не проверенных авторов."""
+        if not self.user.is_authenticated:
+            return
+        author_ids = set(author_ids) - self.loaded_ids
+        if not author_ids:
+            return
+        self.subscribed_ids.update(
+            UserSubscriptions.objects.filter(
+                user=self.user, author_id__in=author_ids
+            ).values_list("author_id", flat=True)
+        )
+        self.loaded_ids.update(author_ids)
+
+    def is_subscribed(self, author_id):
+        """Проверяем, подписан ли пользователь на автора."""
+        if not self.user.is_authenticated or author_id == self.user.id:
+            return False
+        self.prime((author_id,))
+        return author_id in self.subscribed_ids
+
+
+def is_subscribed(context, author_id):
+    """Проверка подписки через резолвер запроса из контекста."""
+    request = context.get("request")
+    if not request:
+        return False
+    return SubscriptionResolver.for_request(request).is_subscribed(author_id)
+
+
+class SubscribedListSerializer(serializers.ListSerializer):
+    """
+    Список, который перед сериализацией загружает подписки
+    на всех авторов страницы одним запросом.
+    Поле с id автора задаётся атрибутом author_id_field дочернего
+    сериализатора.
+    """
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.Manager) else data)
+        request = self.context.get("request")
+        if request:
+            field = self.child.author_id_field
+            SubscriptionResolver.for_request(request).prime(
+                getattr(item, field) for item in items
+            )
+        return super().to_representation(items)
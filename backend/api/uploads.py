@@ -0,0 +1,75 @@
+"""
+Загрузка картинок файлом в multipart/form-data.
+
+Обработчик загрузки пишет файл на диск по мере чтения тела запроса
+и прерывает загрузку больше IMAGE_UPLOAD_MAX_SIZE, не дочитывая ее.
+Он подключается только парсером представлений API с картинками
+(IMAGE_UPLOAD_PARSERS): его ошибка UploadTooLarge обрабатывается DRF,
+остальные представления (админка) загружают файлы обработчиками Django.
+Размеры картинки проверяются по заголовку файла до декодирования.
+"""
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image, UnidentifiedImageError
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "Размер загружаемого файла слишком большой."
+    default_code = "upload_too_large"
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """Потоковая запись загрузки во временный файл с ограничением размера."""
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        # Кроме файла в теле запроса могут быть обычные поля формы
+        if content_length > (
+            settings.IMAGE_UPLOAD_MAX_SIZE
+            + settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        ):
+            raise UploadTooLarge()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.IMAGE_UPLOAD_MAX_SIZE:
+            self.file.close()
+            raise UploadTooLarge()
+        return super().receive_data_chunk(raw_data, start)
+
+
+class ImageMultiPartParser(MultiPartParser):
+    """multipart/form-data с записью файлов через ImageUploadHandler."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context["request"]
+        request.upload_handlers = [ImageUploadHandler(request)]
+        return super().parse(stream, media_type, parser_context)
+
+
+IMAGE_UPLOAD_PARSERS = (JSONParser, FormParser, ImageMultiPartParser)
+
+
+def validate_image_upload(file):
+    """Проверяем размер файла и количество пикселей без декодирования."""
+    if file.size > settings.IMAGE_UPLOAD_MAX_SIZE:
+        raise serializers.ValidationError(
+            "Размер изображения не должен превышать "
+            f"{settings.IMAGE_UPLOAD_MAX_SIZE // (1024 * 1024)} MB."
+        )
+    try:
+        # Image.open читает только заголовок
+        with Image.open(file) as image:
+            width, height = image.size
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        raise serializers.ValidationError("Загрузите корректное изображение.")
+    finally:
+        file.seek(0)
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise serializers.ValidationError(
+            f"Изображение {width}x{height} слишком большое: не больше "
+            f"{settings.IMAGE_MAX_PIXELS} пикселей."
+        )
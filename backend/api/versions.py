@@ -0,0 +1,29 @@
+"""Версии данных в кэше."""
+import uuid
+
+from django.core.cache import cache
+
+
+class CacheVersion:
+    """
+    Версия данных, которые каждый процесс держит у себя в памяти.
+    Версия хранится в кэше (CACHES) и по истечении timeout меняется сама.
+    Сброс в одном процессе виден всем, только если кэш общий (memcached
+    в production); с кэшем в памяти процесса (LocMemCache) остальные
+    процессы увидят изменения не позже чем через timeout.
+    """
+
+    def __init__(self, key, timeout):
+        self.key = key
+        self.timeout = timeout
+
+    def get(self):
+        version = cache.get(self.key)
+        if version is None:
+            version = uuid.uuid4().hex
+            if not cache.add(self.key, version, self.timeout):
+                version = cache.get(self.key, version)
+        return version
+
+    def invalidate(self):
+        cache.set(self.key, uuid.uuid4().hex, self.timeout)
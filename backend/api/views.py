@@ -1,19 +1,31 @@
-from api.filters import IngredientSearchFilter, RecipeFilter
-from api.pagination import FoodgramPagination
+from itertools import chain
+
+from api.conditional import conditional_response, get_recipe_versions
+from api.filters import (IngredientSearchFilter, RecipeFilter,
+                         RecipeSearchFilter)
+from api.pagination import FoodgramCursorPagination, FoodgramPagination
 from api.permissions import IsAuthorOrReadOnly
-from api.recipes_utils import format_shopping_cart
+from api.recipes_utils import (export_shopping_cart, get_authors_recipes,
+                               get_recipes_limit)
+from api.renderers import SHOPPING_CART_RENDERERS, QueryFormatNegotiation
 from api.serializers import (AvatarSerializer, IngredientSerializer,
-                             RecipeCreateUpdateSerializer, RecipeSerializer,
-                             SubscriptionsSerializer, TagSerializer)
+                             RecipeCreateUpdateSerializer, RecipeIdsSerializer,
+                             RecipeSerializer, SubscriptionsSerializer,
+                             TagSerializer)
+from api.snapshots import (SnapshotListMixin, ingredients_snapshot,
+                           tags_snapshot)
+from api.uploads import IMAGE_UPLOAD_PARSERS
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import FileResponse
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserUserViewSet
-from recipes.models import (Ingredient, Recipe, RecipeIngredient, Tag,
+from recipes.models import (Ingredient, Recipe, ShoppingCartIngredient, Tag,
                             UserFavorite, UserShoppingList, UserSubscriptions)
+from recipes.user_lists import add_recipes, lock_user, remove_recipes
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
@@ -40,7 +52,9 @@ class ExtendedUserViewSet(DjoserUserViewSet):
         url_path="me/avatar",
         permission_classes=[IsAuthenticated],
         serializer_class=AvatarSerializer,
+        parser_classes=IMAGE_UPLOAD_PARSERS,
     )
+    @transaction.atomic
     def avatar(self, request):
         """Представление для взаимодействия пользователя со своим аватаром."""
         user = request.user
@@ -52,10 +66,13 @@ class ExtendedUserViewSet(DjoserUserViewSet):
         return Response(serializer.data)
 
     @avatar.mapping.delete
+    @transaction.atomic
     def delete_avatar(self, request):
         """Удаление аватара пользователя."""
         if request.user.avatar:
-            request.user.avatar.delete()
+            # Файл может быть общим с другими загрузками, его удалит
+            # collect_media_garbage, когда на него не останется ссылок
+            request.user.avatar = ""
             request.user.save()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -105,10 +122,17 @@ class ExtendedUserViewSet(DjoserUserViewSet):
     def subscriptions(self, request):
         """Получаем список подписок текущего пользователя."""
         user = request.user
-        subscriptions = UserSubscriptions.objects.filter(user=user)
+        subscriptions = UserSubscriptions.objects.filter(
+            user=user
+        ).select_related("author")
         page = self.paginate_queryset(subscriptions)
+        author_recipes = get_authors_recipes(
+            (subscription.author_id for subscription in page),
+            get_recipes_limit(request)
+        )
         serializer = SubscriptionsSerializer(
-            page, many=True, context={"request": request}
+            page, many=True,
+            context={"request": request, "author_recipes": author_recipes}
         )
         return self.get_paginated_response(serializer.data)
 
@@ -116,14 +140,105 @@ class ExtendedUserViewSet(DjoserUserViewSet):
 class RecipeViewSet(viewsets.ModelViewSet):
     """Представление для рецептов."""
 
-    queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     http_method_names = ("get", "post", "patch", "delete")
     pagination_class = FoodgramPagination
-    filter_backends = [DjangoFilterBackend, SearchFilter]
+    filter_backends = [DjangoFilterBackend, RecipeSearchFilter]
     filterset_class = RecipeFilter
     permission_classes = (IsAuthorOrReadOnly,)
-    search_fields = ['name']
+    parser_classes = IMAGE_UPLOAD_PARSERS
+
+    @property
+    def paginator(self):
+        """
+        Курсорная пагинация по запросу ?pagination=cursor.
+        Результаты поиска (?search=) сортируются по релевантности,
+        а курсор — по дате создания, поэтому они всегда постраничные.
+        """
+        if not hasattr(self, "_paginator"):
+            cursor = FoodgramCursorPagination.is_requested(self.request)
+            if cursor and not RecipeSearchFilter.is_requested(self.request):
+                self._paginator = FoodgramCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_queryset(self):
+        """Рецепты со связанными объектами и признаками для пользователя."""
+        if self.action == "partial_update":
+            # Текущие теги и ингредиенты нужны для записи разницы
+            return Recipe.objects.select_related("author").prefetch_related(
+                "tags", "recipeingredients"
+            )
+        return Recipe.objects.with_related().with_user_flags(
+            self.request.user
+        )
+
+    def update(self, request, *args, **kwargs):
+        """
+        Обновление рецепта. В отличие от UpdateModelMixin кэш
+        prefetch_related не сбрасываем: сериализатор сам кладет
+        в него записанные теги и ингредиенты.
+        """
+        serializer = self.get_serializer(
+            self.get_object(), data=request.data,
+            partial=kwargs.pop("partial", False)
+        )
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
+        return Response(serializer.data)
+
+    def list(self, request, *args, **kwargs):
+        """
+        Список рецептов с поддержкой условных запросов. Страница
+        выбирается один раз по версиям рецептов, затем по ее id
+        загружаются рецепты со связанными объектами.
+        """
+        versions = self.paginate_queryset(get_recipe_versions(
+            self.filter_queryset(self.get_queryset()), request.user
+        ))
+        page = getattr(self.paginator, "page", None)
+        count = page.paginator.count if hasattr(page, "paginator") else None
+        not_modified, headers = conditional_response(
+            request, versions, count, last_modified=False
+        )
+        if not_modified is not None:
+            return not_modified
+        recipes = self.get_queryset().in_bulk(
+            [row["id"] for row in versions]
+        )
+        serializer = self.get_serializer(
+            [recipes[row["id"]] for row in versions if row["id"] in recipes],
+            many=True
+        )
+        return self.with_headers(
+            self.get_paginated_response(serializer.data), headers
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        """Рецепт с поддержкой условных запросов."""
+        try:
+            queryset = self.filter_queryset(self.get_queryset()).filter(
+                pk=kwargs["pk"]
+            )
+        except (TypeError, ValueError, DjangoValidationError):
+            # Как в rest_framework.generics.get_object_or_404
+            raise Http404
+        versions = list(get_recipe_versions(queryset, request.user))
+        if not versions:
+            return super().retrieve(request, *args, **kwargs)
+        not_modified, headers = conditional_response(request, versions)
+        if not_modified is not None:
+            return not_modified
+        return self.with_headers(
+            super().retrieve(request, *args, **kwargs), headers
+        )
+
+    @staticmethod
+    def with_headers(response, headers):
+        for header, value in headers.items():
+            response[header] = value
+        return response
 
     def get_serializer_class(self):
         """Возвращает сериализатор в зависимости от действия (action)."""
@@ -141,8 +256,11 @@ class RecipeViewSet(viewsets.ModelViewSet):
         )
         return Response({"short-link": short_url}, status=status.HTTP_200_OK)
 
+    @transaction.atomic
     def handle_add_remove(self, request, model, user, recipe, action_type):
         """Общий метод для добавления/удаления рецептов """
+        # Та же блокировка, что и у пакетных действий
+        lock_user(user)
         if request.method == "DELETE":
             # Удаление рецепта из избранного или списка покупок
             get_object_or_404(model, user=user, recipe=recipe).delete()
@@ -181,47 +299,105 @@ class RecipeViewSet(viewsets.ModelViewSet):
             request, UserShoppingList, user, recipe, "список покупок"
         )
 
-    @action(["get"], detail=False, permission_classes=(IsAuthenticated,))
+    def handle_bulk_add_remove(self, request, model):
+        """
+        Общий метод для пакетного добавления (POST) и удаления (DELETE)
+        рецептов из списка ids с результатом для каждого рецепта.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        change = remove_recipes if request.method == "DELETE" else add_recipes
+        results = change(
+            model, request.user, serializer.validated_data["ids"]
+        )
+        return Response({
+            "results": [
+                {"id": recipe_id, "result": result}
+                for recipe_id, result in results.items()
+            ]
+        })
+
+    @action(
+        ["post", "delete"],
+        detail=False,
+        url_path="favorite",
+        permission_classes=(IsAuthenticated,)
+    )
+    def bulk_favorite(self, request):
+        """Пакетное добавление/удаление рецептов из избранного."""
+        return self.handle_bulk_add_remove(request, UserFavorite)
+
+    @action(
+        ["post", "delete"],
+        detail=False,
+        url_path="shopping_cart",
+        permission_classes=(IsAuthenticated,)
+    )
+    def bulk_shopping_cart(self, request):
+        """Пакетное добавление/удаление рецептов из списка покупок."""
+        return self.handle_bulk_add_remove(request, UserShoppingList)
+
+    @action(
+        ["get"],
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=SHOPPING_CART_RENDERERS,
+        content_negotiation_class=QueryFormatNegotiation,
+    )
     def download_shopping_cart(self, request):
-        """Формирует и скачивает список покупок в виде текстового файла."""
+        """
+        Формирует и скачивает список покупок в формате txt, csv или json
+        (параметр ?format=). Файл передается потоком по мере чтения
+        агрегированных ингредиентов.
+        """
         user = request.user
-        recipes = Recipe.objects.filter(usershoppinglists__user=user)
 
-        # Получаем ингредиенты и рецепты из списка покупок пользователя
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__in=recipes
+        # Получаем суммарные ингредиенты из списка покупок пользователя
+        ingredients = ShoppingCartIngredient.objects.filter(
+            user=user
         ).values(
-            "ingredient__name", "ingredient__measurement_unit"
-        ).annotate(amount=Sum("amount")).order_by("ingredient__name")
+            "ingredient__name", "ingredient__measurement_unit", "amount"
+        ).order_by("ingredient__name").iterator()
 
-        if not ingredients.exists():
+        first_ingredient = next(ingredients, None)
+        if first_ingredient is None:
             raise ValidationError("Список покупок пуст.")
 
-        # Формируем текст для файла со списком покупок
-        shopping_cart_content = format_shopping_cart(ingredients, recipes)
-
-        # Возвращаем файл как текстовый ответ с правильным расширением .txt
-        return FileResponse(
-            shopping_cart_content, as_attachment=True,
-            filename="shopping_cart.txt", content_type="text/plain"
+        recipes = Recipe.objects.filter(
+            usershoppinglists__user=user
+        ).values_list("name", flat=True).iterator()
+        export_format = request.accepted_renderer.format
+        response = StreamingHttpResponse(
+            export_shopping_cart(
+                export_format, chain((first_ingredient,), ingredients), recipes
+            ),
+            content_type=(
+                f"{request.accepted_renderer.media_type}; charset=utf-8"
+            ),
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="shopping_cart.{export_format}"'
         )
+        return response
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(SnapshotListMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для получения ингредиентов (только чтение)."""
 
+    snapshot = ingredients_snapshot
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = [AllowAny]
     filter_backends = [
-        IngredientSearchFilter, DjangoFilterBackend, SearchFilter
+        DjangoFilterBackend, SearchFilter, IngredientSearchFilter
     ]
     search_fields = ['name']
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(SnapshotListMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для получения тегов (только чтение)."""
 
+    snapshot = tags_snapshot
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = [AllowAny]
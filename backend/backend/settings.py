@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from corsheaders.defaults import default_headers
@@ -43,6 +44,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.SQLInstrumentationMiddleware',
+    'api.middleware.MetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -99,6 +102,24 @@ else:
         }
     }
 
+# Кэш общий для всех воркеров: в нем токены (api.authentication)
+# и версии справочников и индекса ингредиентов (api.versions),
+# их сброс должен быть виден всем процессам
+if ENVIRONMENT == 'production':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': os.getenv('CACHE_LOCATION', 'memcached:11211'),
+        }
+    }
+else:
+    # Сервер разработки работает одним процессом
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -149,12 +170,32 @@ AUTH_USER_MODEL = 'recipes.FoodgramUser'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = '/app/media'
 
+# Картинки рецептов и аватары хранятся по хешу содержимого
+# (recipes.storage): одинаковые загрузки занимают один файл
+DEFAULT_FILE_STORAGE = 'recipes.storage.ContentAddressedStorage'
+MEDIA_CONTENT_ADDRESSED_DIRS = ('recipes/images', 'users')
+
+# Картинки, загруженные файлами в API, пишутся сразу на диск
+# (api.uploads) и ограничены по размеру и количеству пикселей
+IMAGE_UPLOAD_MAX_SIZE = 5 * 1024 * 1024
+IMAGE_MAX_PIXELS = 40_000_000
+
+# Размеры уменьшенных копий картинок (наибольшая сторона в пикселях).
+# Выбираются параметрами запроса image_size и image_format=webp
+IMAGE_SIZES = {
+    'thumb': 160,
+    'card': 480,
+    'large': 1024,
+}
+# Потоки, в которых копии создаются после сохранения картинки
+IMAGE_VARIANT_THREADS = int(os.getenv('IMAGE_VARIANT_THREADS', 2))
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
 
     # Добавляем бэкенды для фильтрации и поиска
@@ -198,3 +239,47 @@ SHORT_URL_CODE_MAX_LENGTH = 10
 SHORT_LINK_URL_PATH = 's'
 
 DEFAULT_PAGE_SIZE = 10
+
+# Наибольшее количество рецептов в пакетных действиях
+# с избранным и списком покупок
+RECIPES_BULK_MAX_IDS = 100
+
+# Время жизни версии индекса ингредиентов в кэше (в секундах):
+# по истечении индекс в памяти процессов перестраивается. Без общего
+# кэша это наибольшая задержка, с которой воркеры видят изменения
+INGREDIENT_INDEX_TTL = 300
+
+# Наибольшее количество ингредиентов в ответе на поиск по названию
+INGREDIENT_SEARCH_LIMIT = 100
+# Наименьшая длина запроса для поиска по подстроке; более короткие
+# ищутся только по началу названия
+INGREDIENT_SUBSTRING_MIN_LENGTH = 3
+
+# Время жизни версии снимков справочников (тегов и ингредиентов) в кэше
+REFERENCE_SNAPSHOT_TTL = 300
+
+# Инструментирование SQL-запросов
+SQL_INSTRUMENTATION_ENABLED = (
+    os.getenv('SQL_INSTRUMENTATION_ENABLED', 'False') == 'True'
+)
+# Отдавать заголовки Server-Timing и X-DB-Queries
+SQL_INSTRUMENTATION_HEADERS = (
+    os.getenv('SQL_INSTRUMENTATION_HEADERS', str(DEBUG)) == 'True'
+)
+# Бюджеты запроса: количество SQL-запросов и время в базе (мс)
+SQL_QUERY_BUDGET = int(os.getenv('SQL_QUERY_BUDGET', 30))
+SQL_TIME_BUDGET_MS = int(os.getenv('SQL_TIME_BUDGET_MS', 200))
+# Сколько повторов одного запроса считать признаком N+1
+SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv('SQL_N_PLUS_ONE_THRESHOLD', 5))
+
+# Время жизни токена с пользователем в кэше аутентификации (в секундах)
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 60))
+
+# Метрики в формате Prometheus (эндпоинт /metrics)
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+# Каталог файлов метрик воркеров; очищается при перезапуске сервера
+METRICS_DIR = os.getenv(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'foodgram-metrics')
+)
+# Токен для доступа к /metrics (заголовок Authorization: Bearer <токен>)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
@@ -1,3 +1,4 @@
+from api.metrics import metrics_view
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
@@ -6,5 +7,6 @@ from django.urls import include, path
 urlpatterns = [
     path("api/", include("api.urls")),
     path("admin/", admin.site.urls),
+    path("metrics", metrics_view, name="metrics"),
     path("", include("recipes.urls", namespace='recipes')),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
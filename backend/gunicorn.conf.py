@@ -0,0 +1,16 @@
+import glob
+import os
+import tempfile
+
+bind = "0.0.0.0:8000"
+workers = int(os.getenv("GUNICORN_WORKERS", 1))
+wsgi_app = "backend.wsgi"
+
+
+def on_starting(server):
+    """Удаляем файлы метрик воркеров предыдущего запуска."""
+    metrics_dir = os.getenv(
+        "METRICS_DIR", os.path.join(tempfile.gettempdir(), "foodgram-metrics")
+    )
+    for path in glob.glob(os.path.join(metrics_dir, "metrics_*.db")):
+        os.remove(path)
@@ -1,10 +1,13 @@
 from django.contrib import admin
 from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin
+from django.db.models import Count, Exists, OuterRef
 from django.utils.safestring import mark_safe
 from recipes.constants import MIN_COOKING_TIME
 from recipes.models import (Ingredient, Recipe, RecipeIngredient, Tag,
                             UserFavorite, UserShoppingList, UserSubscriptions)
+from recipes.search import update_search_documents
+from recipes.shopping_cart import get_recipe_amounts, update_recipe_in_carts
 
 User = get_user_model()
 
@@ -18,30 +21,122 @@ class CookingTimeFilter(admin.SimpleListFilter):
     # Константы для порогов
     MAX_TIME_FAST = 15  # Порог для быстрого приготовления (15 мин)
     MAX_TIME_MEDIUM = 30  # Порог для среднего времени приготовления (30 мин)
-    MAX_TIME_INFINITE = 10**10  # Порог для бесконечного времени
 
     def lookups(self, request, model_admin):
         return [
-            ((MIN_COOKING_TIME, self.MAX_TIME_FAST), "Быстрее 15 мин"),
-            ((self.MAX_TIME_FAST + 1, self.MAX_TIME_MEDIUM), "Быстрее 30 мин"),
+            (f"{MIN_COOKING_TIME}-{self.MAX_TIME_FAST}", "Быстрее 15 мин"),
             (
-                (self.MAX_TIME_MEDIUM + 1, self.MAX_TIME_INFINITE),
-                "Дольше 30 мин"
+                f"{self.MAX_TIME_FAST + 1}-{self.MAX_TIME_MEDIUM}",
+                "Быстрее 30 мин"
             ),
+            (f"{self.MAX_TIME_MEDIUM + 1}-", "Дольше 30 мин"),
         ]
 
     def queryset(self, request, queryset):
         value = self.value()
-        if value:
-            min_time, max_time = eval(value)
-            return queryset.filter(cooking_time__range=(min_time, max_time))
+        if not value:
+            return queryset
+        min_time, _, max_time = value.partition("-")
+        try:
+            queryset = queryset.filter(cooking_time__gte=int(min_time))
+            if max_time:
+                queryset = queryset.filter(cooking_time__lte=int(max_time))
+        except ValueError:
+            return queryset.none()
         return queryset
 
 
-class HasRecipesFilter(admin.SimpleListFilter):
+class InputFilter(admin.SimpleListFilter):
+    """
+    Фильтр с полем ввода вместо списка вариантов.
+    Не перечисляет связанную таблицу на каждой странице.
+    """
+
+    template = "admin/input_filter.html"
+
+    def lookups(self, request, model_admin):
+        # Фиктивный вариант, без него фильтр не отображается
+        return ((),)
+
+    def choices(self, changelist):
+        all_choice = next(super().choices(changelist))
+        all_choice["query_parts"] = (
+            (key, value)
+            for key, value in changelist.get_filters_params().items()
+            if key != self.parameter_name
+        )
+        yield all_choice
+
+
+class RelatedInputFilter(InputFilter):
+    """
+    Фильтр по связанному объекту: по id или точному значению поля
+    search_field связанной модели.
+    """
+
+    field_name = None
+    search_field = None
+
+    def queryset(self, request, queryset):
+        value = (self.value() or "").strip()
+        if not value:
+            return queryset
+        if value.isdigit():
+            return queryset.filter(**{f"{self.field_name}_id": value})
+        return queryset.filter(
+            **{f"{self.field_name}__{self.search_field}": value}
+        )
+
+
+class UserInputFilter(RelatedInputFilter):
+    """Фильтр по пользователю (id или имя пользователя)."""
+    title = 'пользователю'
+    parameter_name = 'user'
+    field_name = 'user'
+    search_field = 'username'
+
+
+class AuthorInputFilter(RelatedInputFilter):
+    """Фильтр по автору (id или имя пользователя)."""
+    title = 'автору'
+    parameter_name = 'author'
+    field_name = 'author'
+    search_field = 'username'
+
+
+class RecipeInputFilter(RelatedInputFilter):
+    """Фильтр по рецепту (id или название)."""
+    title = 'рецепту'
+    parameter_name = 'recipe'
+    field_name = 'recipe'
+    search_field = 'name'
+
+
+class ExistsFilter(admin.SimpleListFilter):
+    """
+    Фильтр по наличию связанных объектов через EXISTS,
+    без соединения таблиц и DISTINCT.
+    """
+
+    related_model = None
+    related_field = None
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value not in ('yes', 'no'):
+            return queryset
+        exists = Exists(self.related_model.objects.filter(
+            **{self.related_field: OuterRef('pk')}
+        ))
+        return queryset.filter(exists if value == 'yes' else ~exists)
+
+
+class HasRecipesFilter(ExistsFilter):
     """Фильтр для пользователей, у которых есть рецепты."""
     title = 'с рецептами'
     parameter_name = 'has_recipes'
+    related_model = Recipe
+    related_field = 'author'
 
     def lookups(self, request, model_admin):
         return (
@@ -49,17 +144,13 @@ class HasRecipesFilter(admin.SimpleListFilter):
             ('no', 'Без рецептов'),
         )
 
-    def queryset(self, request, queryset):
-        value = self.value()
-        if value in ['yes', 'no']:
-            return queryset.filter(recipes__isnull=(value == 'no')).distinct()
-        return queryset
 
-
-class HasSubscriptionsFilter(admin.SimpleListFilter):
+class HasSubscriptionsFilter(ExistsFilter):
     """Фильтр для пользователей с подписками."""
     title = 'с подписками'
     parameter_name = 'has_subscriptions'
+    related_model = UserSubscriptions
+    related_field = 'user'
 
     def lookups(self, request, model_admin):
         return (
@@ -67,17 +158,13 @@ class HasSubscriptionsFilter(admin.SimpleListFilter):
             ('no', 'Без подписок'),
         )
 
-    def queryset(self, request, queryset):
-        value = self.value()
-        if value in ['yes', 'no']:
-            return queryset.filter(recipes__isnull=(value == 'no')).distinct()
-        return queryset
-
 
-class HasSubscribersFilter(admin.SimpleListFilter):
+class HasSubscribersFilter(ExistsFilter):
     """Фильтр для пользователей, на которых подписаны другие."""
     title = 'с подписчиками'
     parameter_name = 'has_subscribers'
+    related_model = UserSubscriptions
+    related_field = 'author'
 
     def lookups(self, request, model_admin):
         return (
@@ -85,22 +172,21 @@ class HasSubscribersFilter(admin.SimpleListFilter):
             ('no', 'Без подписчиков'),
         )
 
-    def queryset(self, request, queryset):
-        value = self.value()
-        if value in ['yes', 'no']:
-            return queryset.filter(recipes__isnull=(value == 'no')).distinct()
-        return queryset
-
 
 class TagAdmin(admin.ModelAdmin):
     """Отображение тегов."""
     search_fields = ("name", "slug")
     list_display = ("name", "slug", "recipes_count")
 
-    @admin.display(description="Количество рецептов")
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            recipes_count=Count("recipes")
+        )
+
+    @admin.display(description="Количество рецептов", ordering="recipes_count")
     def recipes_count(self, tag):
         """Количество рецептов, использующих данный тег."""
-        return tag.recipes.count()
+        return tag.recipes_count
 
 
 class IngredientAdmin(admin.ModelAdmin):
@@ -109,9 +195,15 @@ class IngredientAdmin(admin.ModelAdmin):
     list_display = ("name", "measurement_unit", "recipes_count")
     list_filter = ("measurement_unit",)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            recipes_count=Count("recipes", distinct=True)
+        )
+
+    @admin.display(description="Количество рецептов", ordering="recipes_count")
     def recipes_count(self, ingredient):
         """Количество рецептов, использующих данный ингредиент."""
-        return ingredient.recipes.count()
+        return ingredient.recipes_count
 
 
 class RecipeIngredientInline(admin.TabularInline):
@@ -152,7 +244,7 @@ class RecipeAdmin(admin.ModelAdmin):
         "author__last_name",
         "tags__name",
     )
-    list_filter = ("tags__name", "author", CookingTimeFilter)
+    list_filter = ("tags__name", AuthorInputFilter, CookingTimeFilter)
 
     fields = (
         "name",
@@ -163,9 +255,26 @@ class RecipeAdmin(admin.ModelAdmin):
         "count_favorites",
         "display_image",
     )
-    autocomplete_fields = ['ingredients']
+    autocomplete_fields = ['author']
+    list_select_related = ("author",)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(
+            "tags", "recipeingredients__ingredient"
+        )
 
-    @admin.display(description="Время приготовления")
+    def save_related(self, request, form, formsets, change):
+        """
+        Обновляем списки покупок, поисковый документ и время изменения
+        рецепта после сохранения ингредиентов и тегов.
+        """
+        old_amounts = get_recipe_amounts(form.instance.id)
+        super().save_related(request, form, formsets, change)
+        update_recipe_in_carts(form.instance.id, old_amounts)
+        update_search_documents((form.instance.id,))
+        Recipe.objects.filter(pk=form.instance.pk).touch()
+
+    @admin.display(description="Время приготовления", ordering="cooking_time")
     def cooking_time_with_units(self, recipe):
         if recipe.cooking_time >= 60:
             hours = recipe.cooking_time // 60
@@ -200,9 +309,9 @@ class RecipeAdmin(admin.ModelAdmin):
             )
         )
 
-    @admin.display(description="Избранные")
+    @admin.display(description="Избранные", ordering="favorites_count")
     def count_favorites(self, recipe):
-        return recipe.userfavorites.count()
+        return recipe.favorites_count
 
 
 class FoodgramUserAdmin(UserAdmin):
@@ -231,38 +340,44 @@ class FoodgramUserAdmin(UserAdmin):
             )
         return "Нет аватара"
 
-    @admin.display(description="Рецепты")
+    @admin.display(description="Рецепты", ordering="recipes_count")
     def recipe_count(self, user):
         """Количество рецептов пользователя."""
-        return user.recipes.count()
+        return user.recipes_count
 
-    @admin.display(description="Подписки")
+    @admin.display(description="Подписки", ordering="subscriptions_count")
     def subscription_count(self, user):
         """Количество подписок пользователя."""
-        return user.subscribers.count()
+        return user.subscriptions_count
 
-    @admin.display(description="Подписчики")
+    @admin.display(description="Подписчики", ordering="subscribers_count")
     def subscriber_count(self, user):
         """Количество подписчиков пользователя."""
-        return user.author_users.count()
+        return user.subscribers_count
 
 
 class UserFavoriteAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
     search_fields = ('user__username', 'recipe__name')
-    list_filter = ('user', 'recipe')
+    list_filter = (UserInputFilter, RecipeInputFilter)
+    autocomplete_fields = ('user', 'recipe')
 
 
 class UserShoppingListAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
     search_fields = ('user__username', 'recipe__name')
-    list_filter = ('user', 'recipe')
+    list_filter = (UserInputFilter, RecipeInputFilter)
+    autocomplete_fields = ('user', 'recipe')
 
 
 class UserSubscriptionsAdmin(admin.ModelAdmin):
     list_display = ("user", "author")  # Показываем кто на кого подписан
+    list_select_related = ("user", "author")
     search_fields = ("user__username", "author__username")
-    list_filter = ("user", "author")
+    list_filter = (UserInputFilter, AuthorInputFilter)
+    autocomplete_fields = ("user", "author")
 
 
 # Регистрация моделей
@@ -0,0 +1,76 @@
+"""Пакетная запись больших объемов данных."""
+import csv
+import io
+
+from django.db import connection
+
+
+def batched(rows, size):
+    """Разбиваем поток строк на пачки по size штук."""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class BulkCreateWriter:
+    """Запись пачки через bulk_create с пропуском конфликтов."""
+
+    def write(self, model, objects):
+        model.objects.bulk_create(objects, ignore_conflicts=True)
+
+
+class CopyWriter:
+    """
+    Запись пачки через COPY во временную таблицу PostgreSQL
+    и INSERT ... ON CONFLICT DO NOTHING в целевую.
+    """
+
+    NULL = "\\N"
+
+    def write(self, model, objects):
+        fields = [
+            field for field in model._meta.concrete_fields
+            if not field.primary_key
+        ]
+        table = model._meta.db_table
+        temp_table = f"import_{table}"
+        columns = ", ".join(f'"{field.column}"' for field in fields)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for obj in objects:
+            writer.writerow([self.prepare(field, obj) for field in fields])
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMP TABLE IF NOT EXISTS "{temp_table}" AS '
+                f'SELECT {columns} FROM "{table}" WITH NO DATA'
+            )
+            cursor.execute(f'TRUNCATE "{temp_table}"')
+            cursor.copy_expert(
+                f'COPY "{temp_table}" ({columns}) FROM STDIN '
+                f"WITH (FORMAT csv, NULL '{self.NULL}')",
+                buffer
+            )
+            cursor.execute(
+                f'INSERT INTO "{table}" ({columns}) '
+                f'SELECT {columns} FROM "{temp_table}" '
+                f'ON CONFLICT DO NOTHING'
+            )
+
+    def prepare(self, field, obj):
+        value = field.get_db_prep_save(
+            field.pre_save(obj, add=True), connection
+        )
+        return self.NULL if value is None else value
+
+
+def get_writer(use_copy=True):
+    """COPY на PostgreSQL, bulk_create на остальных СУБД."""
+    if use_copy and connection.vendor == "postgresql":
+        return CopyWriter()
+    return BulkCreateWriter()
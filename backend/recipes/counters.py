@@ -0,0 +1,74 @@
+"""
+Денормализованные счетчики рецептов и пользователей.
+
+Счетчики меняются атомарно через F() при создании и удалении избранного,
+подписок и рецептов; reconcile_counters пересчитывает их по данным.
+"""
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from recipes.models import (FoodgramUser, Recipe, UserFavorite,
+                            UserSubscriptions)
+
+# (модель со счетчиком, поле счетчика, модель связи, поле связи)
+COUNTERS = (
+    (Recipe, "favorites_count", UserFavorite, "recipe"),
+    (FoodgramUser, "favorites_count", UserFavorite, "user"),
+    (FoodgramUser, "recipes_count", Recipe, "author"),
+    (FoodgramUser, "subscriptions_count", UserSubscriptions, "user"),
+    (FoodgramUser, "subscribers_count", UserSubscriptions, "author"),
+)
+
+
+def change_counters(instance, delta):
+    """Изменяем счетчики, связанные с созданным или удаленным объектом."""
+    for model, field, related_model, related_field in COUNTERS:
+        if isinstance(instance, related_model):
+            model.objects.filter(
+                pk=getattr(instance, f"{related_field}_id")
+            ).update(**{field: F(field) + delta})
+
+
+def change_counters_bulk(related_model, objects, delta):
+    """
+    Изменяем счетчики для пачки объектов related_model, созданных
+    или удаленных в обход сигналов: запрос на каждый счетчик
+    (и каждое значение изменения), а не на каждый объект.
+    """
+    for model, field, counted_model, related_field in COUNTERS:
+        if counted_model is not related_model:
+            continue
+        changes = Counter(
+            getattr(obj, f"{related_field}_id") for obj in objects
+        )
+        pks_by_change = defaultdict(list)
+        for pk, count in changes.items():
+            pks_by_change[count * delta].append(pk)
+        for change, pks in pks_by_change.items():
+            model.objects.filter(pk__in=pks).update(
+                **{field: F(field) + change}
+            )
+
+
+def reconcile_counters():
+    """
+    Пересчитываем счетчики и исправляем расхождения.
+    Возвращает {"Модель.поле": количество исправленных строк}.
+    """
+    fixed = {}
+    for model, field, related_model, related_field in COUNTERS:
+        actual = Coalesce(Subquery(
+            related_model.objects.filter(
+                **{related_field: OuterRef("pk")}
+            ).order_by().values(related_field).annotate(
+                total=Count("pk")
+            ).values("total")
+        ), 0)
+        drifted = model.objects.annotate(actual=actual).filter(
+            ~Q(**{field: F("actual")})
+        )
+        fixed[f"{model.__name__}.{field}"] = model.objects.filter(
+            pk__in=drifted.values("pk")
+        ).update(**{field: actual})
+    return fixed
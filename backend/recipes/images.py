@@ -0,0 +1,161 @@
+"""
+Уменьшенные копии картинок рецептов и аватаров.
+
+Для каждого размера из IMAGE_SIZES рядом с оригиналом сохраняются
+две копии: в формате оригинала и в WebP, например
+recipes/images/card/pic.png и recipes/images/card/pic.webp.
+Имена вычисляются из имени оригинала, поэтому ссылки на копии
+строятся без обращения к базе. Копии создаются после сохранения
+в фоновом пуле потоков IMAGE_VARIANT_THREADS, не задерживая ответ;
+пропущенные (например, при перезапуске процесса) досоздает команда
+generate_image_variants.
+"""
+import logging
+import os
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger("recipes.images")
+
+ORIGINAL = "original"
+WEBP = "webp"
+
+# Параметры сохранения по форматам Pillow
+SAVE_OPTIONS = {
+    "JPEG": {"quality": 85, "optimize": True, "progressive": True},
+    "PNG": {"optimize": True},
+    "WEBP": {"quality": 80, "method": 4},
+}
+
+variants_executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_VARIANT_THREADS, thread_name_prefix="variants"
+)
+
+
+def get_variant_name(name, size, image_format=ORIGINAL):
+    """Имя копии картинки name в размере size."""
+    if size == ORIGINAL:
+        return name
+    directory, filename = os.path.split(name)
+    stem, extension = os.path.splitext(filename)
+    if image_format == WEBP:
+        extension = ".webp"
+    return os.path.join(directory, size, stem + extension).replace("\\", "/")
+
+
+def get_variant_url(field_file, size, image_format=ORIGINAL):
+    """
+    Ссылка на копию картинки; для размера original и пока копия
+    не создана — на оригинал.
+    """
+    if size == ORIGINAL:
+        return field_file.url
+    name = get_variant_name(field_file.name, size, image_format)
+    if not field_file.storage.exists(name):
+        return field_file.url
+    return field_file.storage.url(name)
+
+
+def _save_variant(storage, name, image, image_format):
+    if image_format == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB")
+    elif image_format == "WEBP" and image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA")
+    buffer = BytesIO()
+    image.save(buffer, image_format, **SAVE_OPTIONS.get(image_format, {}))
+    if storage.exists(name):
+        storage.delete(name)
+    storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def delete_variants(storage, name):
+    """Удаляем все копии картинки name."""
+    for size in settings.IMAGE_SIZES:
+        for image_format in (ORIGINAL, WEBP):
+            storage.delete(get_variant_name(name, size, image_format))
+
+
+def _open_image(storage, name):
+    """
+    Загружаем картинку, отклоняя картинки больше IMAGE_MAX_PIXELS
+    по заголовку; предупреждение Pillow о слишком большой картинке
+    тоже считаем ошибкой.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", Image.DecompressionBombWarning)
+        with storage.open(name) as source:
+            image = Image.open(source)
+            if image.width * image.height > settings.IMAGE_MAX_PIXELS:
+                raise Image.DecompressionBombError(
+                    f"{image.width}x{image.height} pixels"
+                )
+            image.load()
+    return image
+
+
+def generate_variants(field_file, force=False):
+    """
+    Создаем копии картинки во всех размерах IMAGE_SIZES.
+    Возвращаем True, если копии были созданы.
+    """
+    if not field_file:
+        return False
+    storage = field_file.storage
+    sizes = settings.IMAGE_SIZES
+    if not force and all(
+        storage.exists(get_variant_name(field_file.name, size, WEBP))
+        for size in sizes
+    ):
+        return False
+    try:
+        original = _open_image(storage, field_file.name)
+    except (
+        OSError, UnidentifiedImageError,
+        Image.DecompressionBombError, Image.DecompressionBombWarning,
+    ) as error:
+        logger.warning(
+            "Cannot generate variants for %s: %s", field_file.name, error
+        )
+        return False
+    original_format = original.format
+    original = ImageOps.exif_transpose(original)
+    for size, side in sizes.items():
+        variant = original.copy()
+        variant.thumbnail((side, side), Image.Resampling.LANCZOS)
+        # Копия в исходном формате — только для JPEG и PNG
+        if original_format in ("JPEG", "PNG"):
+            _save_variant(
+                storage, get_variant_name(field_file.name, size), variant,
+                original_format
+            )
+        _save_variant(
+            storage, get_variant_name(field_file.name, size, WEBP), variant,
+            "WEBP"
+        )
+    return True
+
+
+def _generate_in_background(field_file):
+    try:
+        generate_variants(field_file)
+    except Exception:
+        # Исключение в пуле потоков иначе потеряется
+        logger.exception(
+            "Cannot generate variants for %s", field_file.name
+        )
+
+
+def schedule_variants(field_file):
+    """Создаем копии картинки в фоновом потоке, возвращаем Future."""
+    if field_file:
+        # Копия без ссылки на объект: объект может измениться
+        # до запуска задачи
+        return variants_executor.submit(
+            _generate_in_background,
+            type(field_file)(None, field_file.field, field_file.name)
+        )
@@ -0,0 +1,156 @@
+import json
+import math
+import platform
+import subprocess
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, override_settings
+from recipes.models import FoodgramUser, Ingredient, Recipe, Tag
+from rest_framework.test import APIClient
+
+
+def percentile(values, percent):
+    """Перцентиль методом ближайшего ранга."""
+    values = sorted(values)
+    rank = max(1, math.ceil(percent / 100 * len(values)))
+    return values[rank - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Замер задержек и количества SQL-запросов горячих эндпоинтов "
+        "внутри процесса. Отчет в JSON можно сравнивать между коммитами. "
+        "Пример команды: python manage.py benchmark --output bench.json"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--iterations", type=int, default=20,
+            help="Количество запросов к каждому эндпоинту",
+        )
+        parser.add_argument(
+            "--warmup", type=int, default=2,
+            help="Количество прогревочных запросов",
+        )
+        parser.add_argument(
+            "--output", default="benchmark.json",
+            help="Путь к JSON-отчету",
+        )
+
+    def handle(self, *args, **options):
+        self.iterations = options["iterations"]
+        self.warmup = options["warmup"]
+        user = FoodgramUser.objects.annotate(
+            cart_size=Count("usershoppinglists")
+        ).order_by("-cart_size", "-subscriptions_count").first()
+        recipe = Recipe.objects.order_by("-favorites_count").first()
+        tag = Tag.objects.first()
+        ingredient = Ingredient.objects.first()
+        if not all((user, recipe, tag, ingredient)):
+            raise CommandError(
+                "Недостаточно данных, сначала выполните generate_data."
+            )
+
+        anonymous = APIClient()
+        authenticated = APIClient()
+        authenticated.force_authenticate(user)
+        endpoints = {
+            "recipes_list": (anonymous, "/api/recipes/?limit=10"),
+            "recipes_list_auth": (authenticated, "/api/recipes/?limit=10"),
+            "recipes_list_filtered": (
+                authenticated,
+                f"/api/recipes/?limit=10&tags={tag.slug}&is_favorited=1"
+            ),
+            "recipes_list_cursor": (
+                authenticated, "/api/recipes/?limit=10&pagination=cursor"
+            ),
+            "recipes_search": (
+                anonymous,
+                f"/api/recipes/?search={recipe.name.split()[0]}"
+            ),
+            "recipe_detail": (
+                authenticated, f"/api/recipes/{recipe.id}/"
+            ),
+            "subscriptions": (
+                authenticated,
+                "/api/users/subscriptions/?limit=10&recipes_limit=3"
+            ),
+            "download_shopping_cart": (
+                authenticated, "/api/recipes/download_shopping_cart/"
+            ),
+            "ingredient_search": (
+                anonymous, f"/api/ingredients/?name={ingredient.name[:2]}"
+            ),
+        }
+        with override_settings(ALLOWED_HOSTS=["testserver"]):
+            results = {
+                name: self.measure(client, url)
+                for name, (client, url) in endpoints.items()
+            }
+        report = {
+            "meta": {
+                "commit": self.get_commit(),
+                "database": connection.vendor,
+                "python": platform.python_version(),
+                "iterations": self.iterations,
+                "rows": {
+                    "users": FoodgramUser.objects.count(),
+                    "recipes": Recipe.objects.count(),
+                    "ingredients": Ingredient.objects.count(),
+                },
+            },
+            "endpoints": results,
+        }
+        with open(options["output"], "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name}: p50={result['p50_ms']}ms "
+                f"p95={result['p95_ms']}ms queries={result['queries']}"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"Report saved to {options['output']}")
+        )
+
+    def request(self, client, url):
+        response = client.get(url)
+        if response.streaming:
+            size = sum(len(chunk) for chunk in response.streaming_content)
+        else:
+            size = len(response.content)
+        return response.status_code, size
+
+    def measure(self, client, url):
+        for _ in range(self.warmup):
+            self.request(client, url)
+        timings = []
+        queries = []
+        for _ in range(self.iterations):
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                status, size = self.request(client, url)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(context.captured_queries))
+        return {
+            "url": url,
+            "status": status,
+            "bytes": size,
+            "queries": max(queries),
+            "p50_ms": round(percentile(timings, 50), 2),
+            "p95_ms": round(percentile(timings, 95), 2),
+            "p99_ms": round(percentile(timings, 99), 2),
+            "mean_ms": round(sum(timings) / len(timings), 2),
+        }
+
+    @staticmethod
+    def get_commit():
+        try:
+            return subprocess.run(
+                ("git", "rev-parse", "--short", "HEAD"),
+                capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
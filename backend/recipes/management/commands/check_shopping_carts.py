@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from recipes.shopping_cart import (get_expected_amounts, get_stored_amounts,
+                                   rebuild_shopping_carts)
+
+
+class Command(BaseCommand):
+    help = (
+        "Проверка таблицы суммарных ингредиентов списков покупок. "
+        "Пример команды: python manage.py check_shopping_carts --rebuild"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Перестроить таблицу с нуля",
+        )
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            rows = rebuild_shopping_carts()
+            self.stdout.write(
+                self.style.SUCCESS(f"Rebuilt shopping carts: {rows} rows")
+            )
+            return
+
+        expected = get_expected_amounts()
+        stored = get_stored_amounts()
+        mismatches = [
+            (key, expected.get(key), stored.get(key))
+            for key in expected.keys() | stored.keys()
+            if expected.get(key) != stored.get(key)
+        ]
+        for (user_id, ingredient_id), expected_amount, stored_amount in (
+            sorted(mismatches)
+        ):
+            self.stdout.write(
+                f"user={user_id} ingredient={ingredient_id}: "
+                f"expected {expected_amount}, stored {stored_amount}"
+            )
+        if mismatches:
+            self.stdout.write(self.style.ERROR(
+                f"Found {len(mismatches)} mismatches, "
+                f"run with --rebuild to fix"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS("Shopping carts are valid"))
@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from recipes.media import collect_garbage, reconcile_refcounts
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчет ссылок на медиафайлы и удаление файлов без ссылок "
+        "вместе с их уменьшенными копиями. "
+        "Пример команды: python manage.py collect_media_garbage "
+        "--grace-minutes 60"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-minutes", type=int, default=60,
+            help="Не удалять файлы, менявшиеся за последние N минут",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Только показать, сколько файлов будет удалено",
+        )
+
+    def handle(self, *args, **options):
+        fixed = reconcile_refcounts()
+        if fixed:
+            self.stdout.write(
+                self.style.WARNING(f"Fixed refcounts of {fixed} blobs")
+            )
+        count, size = collect_garbage(
+            timedelta(minutes=options["grace_minutes"]),
+            dry_run=options["dry_run"]
+        )
+        verb = "Would delete" if options["dry_run"] else "Successfully deleted"
+        self.stdout.write(
+            self.style.SUCCESS(f"{verb} {count} blobs ({size} bytes)")
+        )
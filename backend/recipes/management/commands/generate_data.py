@@ -0,0 +1,201 @@
+import random
+import time
+import uuid
+from array import array
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from recipes.bulk import batched, get_writer
+from recipes.counters import reconcile_counters
+from recipes.models import (FoodgramUser, Ingredient, Recipe,
+                            RecipeIngredient, Tag, UserFavorite,
+                            UserShoppingList, UserSubscriptions)
+from recipes.search import rebuild_search_index
+from recipes.shopping_cart import rebuild_shopping_carts
+
+RecipeTag = Recipe.tags.through
+
+DEFAULT_IMAGE = "recipes/images/default_recipe_image.png"
+DEFAULT_AVATAR = "users/default_avatar.png"
+
+
+def zipf_weights(count, exponent=1.1):
+    """
+    Накопленные веса распределения Ципфа для count элементов:
+    небольшая доля авторов и рецептов собирает большую часть активности.
+    """
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)
+    ))
+
+
+class Command(BaseCommand):
+    help = (
+        "Генерация синтетических пользователей, рецептов, избранного, "
+        "списков покупок и подписок по каталогу ингредиентов и тегов. "
+        "Пример команды: python manage.py generate_data --users 10000 "
+        "--recipes 100000"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--recipes", type=int, default=10000)
+        parser.add_argument(
+            "--favorites", type=float, default=20,
+            help="Среднее количество избранных рецептов на пользователя",
+        )
+        parser.add_argument(
+            "--cart", type=float, default=5,
+            help="Среднее количество рецептов в списке покупок",
+        )
+        parser.add_argument(
+            "--subscriptions", type=float, default=10,
+            help="Среднее количество подписок на пользователя",
+        )
+        parser.add_argument("--seed", type=int, default=None)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--no-copy", action="store_true",
+            help="Не использовать COPY на PostgreSQL",
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.writer = get_writer(use_copy=not options["no_copy"])
+        self.ingredient_ids = list(
+            Ingredient.objects.values_list("id", flat=True)
+        )
+        self.tag_ids = list(Tag.objects.values_list("id", flat=True))
+        if not self.ingredient_ids or not self.tag_ids:
+            raise CommandError(
+                "Каталог ингредиентов и тегов пуст, "
+                "сначала выполните import_data."
+            )
+        # Префикс отличает пользователей разных запусков
+        self.prefix = uuid.uuid4().hex[:8]
+
+        user_ids = self.step("users", self.generate_users, options["users"])
+        recipe_ids = self.step(
+            "recipes", self.generate_recipes, user_ids, options["recipes"]
+        )
+        self.step(
+            "favorites", self.generate_links, UserFavorite, "recipe",
+            user_ids, recipe_ids, options["favorites"]
+        )
+        self.step(
+            "shopping carts", self.generate_links, UserShoppingList,
+            "recipe", user_ids, recipe_ids, options["cart"]
+        )
+        self.step(
+            "subscriptions", self.generate_links, UserSubscriptions,
+            "author", user_ids, user_ids, options["subscriptions"]
+        )
+        self.step("shopping cart aggregates", rebuild_shopping_carts)
+        self.step("counters", reconcile_counters)
+        self.step("search index", rebuild_search_index)
+        self.stdout.write(self.style.SUCCESS("Successfully generated data"))
+
+    def step(self, name, function, *args):
+        started = time.monotonic()
+        result = function(*args)
+        self.stdout.write(f"{name}: {time.monotonic() - started:.2f}s")
+        return result
+
+    def write(self, model, objects):
+        for batch in batched(objects, self.batch_size):
+            self.writer.write(model, batch)
+
+    def generate_users(self, count):
+        now = timezone.now()
+        password = make_password(None)
+        self.write(FoodgramUser, (
+            FoodgramUser(
+                username=f"gen_{self.prefix}_{index}",
+                email=f"gen_{self.prefix}_{index}@example.com",
+                first_name=f"Имя{index}",
+                last_name=f"Фамилия{index}",
+                avatar=DEFAULT_AVATAR,
+                password=password,
+                date_joined=now,
+            )
+            for index in range(count)
+        ))
+        return array("q", FoodgramUser.objects.filter(
+            username__startswith=f"gen_{self.prefix}_"
+        ).order_by("id").values_list("id", flat=True))
+
+    def generate_recipes(self, user_ids, count):
+        if not user_ids:
+            return array("q")
+        # Авторы выбираются по Ципфу: у немногих авторов много рецептов
+        authors = self.random.choices(
+            user_ids, cum_weights=zipf_weights(len(user_ids)), k=count
+        )
+        self.write(Recipe, (
+            Recipe(
+                author_id=author_id,
+                name=f"Рецепт {self.prefix} {index}",
+                image=DEFAULT_IMAGE,
+                text="Синтетический рецепт для нагрузочного тестирования.",
+                cooking_time=max(1, int(self.random.lognormvariate(3.3, 0.6))),
+            )
+            for index, author_id in enumerate(authors)
+        ))
+        # Пользователи этого запуска идут подряд: выбираем по диапазону id
+        # и префиксу названия, а не списком из всех id в запросе
+        recipe_ids = array("q", Recipe.objects.filter(
+            author_id__gte=user_ids[0],
+            author_id__lte=user_ids[-1],
+            name__startswith=f"Рецепт {self.prefix} ",
+        ).order_by("id").values_list("id", flat=True))
+        self.write(RecipeIngredient, (
+            RecipeIngredient(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_id,
+                amount=self.random.randint(1, 500),
+            )
+            for recipe_id in recipe_ids
+            for ingredient_id in self.random.sample(
+                self.ingredient_ids,
+                min(len(self.ingredient_ids), self.random.randint(3, 12))
+            )
+        ))
+        self.write(RecipeTag, (
+            RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in self.random.sample(
+                self.tag_ids, self.random.randint(1, len(self.tag_ids))
+            )
+        ))
+        return recipe_ids
+
+    def generate_links(self, model, target_field, user_ids, target_ids, mean):
+        """
+        Связи пользователей с рецептами или авторами: количество связей
+        на пользователя распределено экспоненциально, популярность целей —
+        по Ципфу.
+        """
+        if not target_ids:
+            return
+        cum_weights = zipf_weights(len(target_ids))
+
+        def links():
+            for user_id in user_ids:
+                count = min(
+                    len(target_ids), int(self.random.expovariate(1 / mean))
+                ) if mean else 0
+                targets = set(self.random.choices(
+                    target_ids, cum_weights=cum_weights, k=count
+                ))
+                if target_field == "author":
+                    # Подписка на самого себя запрещена
+                    targets.discard(user_id)
+                for target_id in targets:
+                    yield model(
+                        user_id=user_id, **{f"{target_field}_id": target_id}
+                    )
+
+        self.write(model, links())
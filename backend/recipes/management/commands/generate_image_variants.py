@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from recipes.images import generate_variants
+from recipes.media import MEDIA_FIELDS
+
+
+class Command(BaseCommand):
+    help = (
+        "Создание уменьшенных копий и WebP-версий для уже загруженных "
+        "картинок рецептов и аватаров. "
+        "Пример команды: python manage.py generate_image_variants"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force", action="store_true",
+            help="Пересоздать копии, даже если они уже есть",
+        )
+
+    def handle(self, *args, **options):
+        generated = 0
+        for model, field_name in MEDIA_FIELDS:
+            field = model._meta.get_field(field_name)
+            names = model.objects.exclude(**{field_name: ""}).values_list(
+                field_name, flat=True
+            ).order_by().distinct().iterator()
+            for name in names:
+                field_file = field.attr_class(None, field, name)
+                generated += generate_variants(
+                    field_file, force=options["force"]
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f"Successfully generated variants for {generated} images"
+        ))
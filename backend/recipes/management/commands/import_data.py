@@ -1,29 +1,220 @@
+import csv
 import json
+import os
+import time
+from array import array
 
+from api.ingredient_index import ingredient_index
+from api.snapshots import ingredients_snapshot, tags_snapshot
+from django.contrib.auth.hashers import make_password
 from django.core.management.base import BaseCommand
-from recipes.models import Ingredient, Tag
+from django.db import transaction
+from django.utils import timezone
+from recipes.bulk import batched, get_writer
+from recipes.counters import reconcile_counters
+from recipes.models import (FoodgramUser, Ingredient, Recipe,
+                            RecipeIngredient, Tag)
+from recipes.search import rebuild_search_index
+
+RecipeTag = Recipe.tags.through
 
 
 class Command(BaseCommand):
     help = (
-        "Загрузка данных из JSON-файлов в модели. ",
-        "Пример команды: python manage.py import_data ",
+        "Загрузка каталога тегов и ингредиентов из JSON-файлов "
+        "и тестовых данных из CSV-файлов в модели. "
+        "Повторный запуск пропускает уже загруженные строки. "
+        "Пример команды: python manage.py import_data --batch-size 5000"
     )
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--data-dir", default="data",
+            help="Каталог с JSON- и CSV-файлами",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=5000,
+            help="Количество строк в одной пачке",
+        )
+        parser.add_argument(
+            "--no-copy", action="store_true",
+            help="Не использовать COPY на PostgreSQL",
+        )
+
     def handle(self, *args, **options):
-        # Импорт данных из JSON-файлов
-        self.import_data_from_json('data/ingredients.json', Ingredient)
-        self.import_data_from_json('data/tags.json', Tag)
+        self.data_dir = options["data_dir"]
+        self.batch_size = options["batch_size"]
+        self.writer = get_writer(use_copy=not options["no_copy"])
 
-    def import_data_from_json(self, json_file_path, model):
-        """Импорт данных из JSON-файла в модель """
-        with open(json_file_path, 'r', encoding='utf-8') as json_file:
-            data_list = json.load(json_file)
+        # Каталог загружается из JSON-файлов, CSV-файлы тегов и
+        # ингредиентов нужны только для номеров строк в файлах связей
+        self.load_catalog("tags.json", Tag)
+        self.load_catalog("ingredients.json", Ingredient)
+
+        # Номер строки в файле -> id в базе
+        self.tag_ids = self.run("tags.csv", self.map_tags)
+        self.ingredient_ids = self.run(
+            "ingredients.csv", self.map_ingredients
+        )
+        self.user_ids = self.run("users.csv", self.import_users)
+        self.recipe_ids = self.run("recipes.csv", self.import_recipes)
+        self.run("recipetag.csv", self.import_recipe_tags)
+        self.run("recipeingredient.csv", self.import_recipe_ingredients)
 
-        # Используем bulk_create для ускорения процесса
-        objects = [model(**data) for data in data_list]
-        model.objects.bulk_create(objects)
+        reconcile_counters()
+        rebuild_search_index()
+        # Пакетная запись не вызывает post_save, сбрасываем кэши сами
+        ingredient_index.invalidate()
+        ingredients_snapshot.invalidate()
+        tags_snapshot.invalidate()
+        self.stdout.write(self.style.SUCCESS("Successfully imported data"))
+
+    def load_catalog(self, file_name, model):
+        """Импорт справочника из JSON-файла, существующие строки
+        пропускаются."""
+        path = os.path.join(self.data_dir, file_name)
+        with open(path, encoding="utf-8") as json_file:
+            data_list = json.load(json_file)
+        for batch in batched(data_list, self.batch_size):
+            with transaction.atomic():
+                self.writer.write(model, [model(**data) for data in batch])
+        self.stdout.write(f"{file_name}: {len(data_list)} rows")
 
+    def run(self, file_name, import_batch):
+        """Потоково читаем CSV-файл и импортируем его пачками."""
+        path = os.path.join(self.data_dir, file_name)
+        ids = array("q", [0])
+        started = time.monotonic()
+        rows = 0
+        with open(path, encoding="utf-8", newline="") as csv_file:
+            for batch in batched(csv.DictReader(csv_file), self.batch_size):
+                with transaction.atomic():
+                    batch_ids = import_batch(batch)
+                if batch_ids is not None:
+                    ids.extend(batch_ids)
+                rows += len(batch)
+        elapsed = time.monotonic() - started
         self.stdout.write(
-            self.style.SUCCESS(f"Successfully imported data for {model}")
+            f"{file_name}: {rows} rows in {elapsed:.2f}s "
+            f"({rows / elapsed if elapsed else rows:.0f} rows/s)"
         )
+        return ids
+
+    @staticmethod
+    def resolve(ids, row_number):
+        """id объекта по номеру строки файла или 0."""
+        try:
+            return ids[int(row_number)]
+        except (IndexError, TypeError, ValueError):
+            return 0
+
+    def map_tags(self, batch):
+        ids = dict(Tag.objects.filter(
+            slug__in=[row["slug"] for row in batch]
+        ).values_list("slug", "id"))
+        return [ids.get(row["slug"], 0) for row in batch]
+
+    def map_ingredients(self, batch):
+        """id ингредиента каталога по строке CSV-файла.
+
+        Единицы измерения в CSV-файле местами расходятся с каталогом,
+        поэтому без точного совпадения ищем ингредиент по названию.
+        """
+        ids = {}
+        by_name = {}
+        for name, unit, pk in Ingredient.objects.filter(
+            name__in={row["name"] for row in batch}
+        ).order_by("id").values_list("name", "measurement_unit", "id"):
+            ids[name, unit] = pk
+            by_name.setdefault(name, pk)
+        return [
+            ids.get(
+                (row["name"], row["measurement_unit"]),
+                by_name.get(row["name"], 0),
+            )
+            for row in batch
+        ]
+
+    def import_users(self, batch):
+        now = timezone.now()
+        self.writer.write(FoodgramUser, [
+            FoodgramUser(
+                username=row["username"],
+                first_name=row["first_name"],
+                last_name=row["last_name"],
+                email=row["email"],
+                avatar=row["avatar"],
+                password=make_password(None),
+                date_joined=now,
+            )
+            for row in batch
+        ])
+        ids = dict(FoodgramUser.objects.filter(
+            email__in=[row["email"] for row in batch]
+        ).values_list("email", "id"))
+        return [ids.get(row["email"], 0) for row in batch]
+
+    def import_recipes(self, batch):
+        keys = [
+            (self.resolve(self.user_ids, row["author_id"]), row["name"])
+            for row in batch
+        ]
+
+        def existing():
+            return {
+                (author_id, name): pk
+                for author_id, name, pk in Recipe.objects.filter(
+                    author_id__in={author_id for author_id, _ in keys},
+                    name__in={name for _, name in keys},
+                ).values_list("author_id", "name", "id")
+            }
+
+        ids = existing()
+        new_recipes = {}
+        for key, row in zip(keys, batch):
+            if key[0] and key not in ids and key not in new_recipes:
+                new_recipes[key] = Recipe(
+                    author_id=key[0],
+                    name=row["name"],
+                    image=row["image"].strip('"'),
+                    text=row["text"].strip('"'),
+                    cooking_time=int(row["cooking_time"]),
+                )
+        if new_recipes:
+            self.writer.write(Recipe, list(new_recipes.values()))
+            ids = existing()
+        return [ids.get(key, 0) for key in keys]
+
+    def import_recipe_tags(self, batch):
+        self.writer.write(RecipeTag, [
+            RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id, tag_id in {
+                (
+                    self.resolve(self.recipe_ids, row["recipe_id"]),
+                    self.resolve(self.tag_ids, row["tag_id"]),
+                )
+                for row in batch
+            }
+            if recipe_id and tag_id
+        ])
+
+    def import_recipe_ingredients(self, batch):
+        rows = {}
+        for row in batch:
+            key = (
+                self.resolve(self.recipe_ids, row["recipe_id"]),
+                self.resolve(self.ingredient_ids, row["ingredient_id"]),
+            )
+            if all(key):
+                rows[key] = int(row["amount"])
+        existing = set(RecipeIngredient.objects.filter(
+            recipe_id__in={recipe_id for recipe_id, _ in rows}
+        ).values_list("recipe_id", "ingredient_id"))
+        self.writer.write(RecipeIngredient, [
+            RecipeIngredient(
+                recipe_id=recipe_id, ingredient_id=ingredient_id,
+                amount=amount
+            )
+            for (recipe_id, ingredient_id), amount in rows.items()
+            if (recipe_id, ingredient_id) not in existing
+        ])
@@ -0,0 +1,154 @@
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from recipes.management.commands.benchmark import percentile
+from recipes.models import Ingredient, Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный тест запущенного сервера: пропускная способность "
+        "и задержки горячих GET-эндпоинтов при нескольких уровнях "
+        "конкурентности. Отчеты разных запусков (например, до и после "
+        "изменения настроек) сравниваются через --baseline. "
+        "Пример команды: python manage.py load_test "
+        "--url http://127.0.0.1:8000 --label after --baseline before.json"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url", required=True, help="Адрес сервера",
+        )
+        parser.add_argument(
+            "--concurrency", default="1,8,32",
+            help="Уровни конкурентности через запятую",
+        )
+        parser.add_argument(
+            "--duration", type=float, default=10,
+            help="Длительность каждого уровня в секундах",
+        )
+        parser.add_argument(
+            "--token", help="Токен для авторизованных запросов",
+        )
+        parser.add_argument(
+            "--label", default="server", help="Метка отчета",
+        )
+        parser.add_argument(
+            "--output", default="load_test.json",
+            help="Путь к JSON-отчету",
+        )
+        parser.add_argument(
+            "--baseline", help="Отчет для сравнения пропускной способности",
+        )
+
+    def handle(self, *args, **options):
+        recipe = Recipe.objects.order_by("-favorites_count").first()
+        ingredient = Ingredient.objects.first()
+        if recipe is None or ingredient is None:
+            raise CommandError(
+                "Недостаточно данных, сначала выполните generate_data."
+            )
+        base_url = options["url"].rstrip("/")
+        self.paths = [
+            "/api/recipes/?limit=10",
+            f"/api/recipes/{recipe.id}/",
+            "/api/tags/",
+            f"/api/ingredients/?name={ingredient.name[:2]}",
+            f"/s/{recipe.id}/",
+        ]
+        self.headers = {}
+        if options["token"]:
+            self.headers["Authorization"] = f"Token {options['token']}"
+        levels = {}
+        for concurrency in options["concurrency"].split(","):
+            concurrency = int(concurrency)
+            result = self.run_level(
+                base_url, concurrency, options["duration"]
+            )
+            levels[str(concurrency)] = result
+            self.stdout.write(
+                f"{options['label']} c={concurrency}: "
+                f"{result['rps']} rps p50={result['p50_ms']}ms "
+                f"p95={result['p95_ms']}ms errors={result['errors']}"
+            )
+        report = {
+            "meta": {
+                "label": options["label"],
+                "url": base_url,
+                "duration": options["duration"],
+                "paths": self.paths,
+            },
+            "levels": levels,
+        }
+        with open(options["output"], "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+        if options["baseline"]:
+            self.compare(report, options["baseline"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Report saved to {options['output']}")
+        )
+
+    def run_level(self, base_url, concurrency, duration):
+        timings = []
+        errors = []
+        lock = threading.Lock()
+        deadline = time.monotonic() + duration
+
+        def client(offset):
+            session = requests.Session()
+            session.headers.update(self.headers)
+            local_timings = []
+            local_errors = 0
+            paths = itertools.islice(
+                itertools.cycle(self.paths), offset, None
+            )
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = session.get(
+                        base_url + next(paths), allow_redirects=False
+                    )
+                    failed = response.status_code >= 400
+                except requests.RequestException:
+                    failed = True
+                local_timings.append(
+                    (time.perf_counter() - started) * 1000
+                )
+                local_errors += failed
+            with lock:
+                timings.extend(local_timings)
+                errors.append(local_errors)
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for offset in range(concurrency):
+                executor.submit(client, offset)
+        elapsed = time.monotonic() - started
+        if not timings:
+            raise CommandError("Сервер не ответил ни на один запрос.")
+        return {
+            "requests": len(timings),
+            "errors": sum(errors),
+            "rps": round(len(timings) / elapsed, 1),
+            "p50_ms": round(percentile(timings, 50), 2),
+            "p95_ms": round(percentile(timings, 95), 2),
+            "p99_ms": round(percentile(timings, 99), 2),
+        }
+
+    def compare(self, report, baseline_path):
+        with open(baseline_path, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        for concurrency, result in report["levels"].items():
+            base = baseline["levels"].get(concurrency)
+            if base is None or not base["rps"]:
+                continue
+            self.stdout.write(
+                f"c={concurrency}: {report['meta']['label']} "
+                f"{result['rps']} rps vs {baseline['meta']['label']} "
+                f"{base['rps']} rps (x{result['rps'] / base['rps']:.2f})"
+            )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from recipes.search import create_search_schema, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Перестроение полнотекстового индекса рецептов. "
+        "Пример команды: python manage.py rebuild_search_index"
+    )
+
+    def handle(self, *args, **options):
+        # Пустую таблицу create_search_schema уже заполнила
+        if not create_search_schema():
+            rebuild_search_index()
+        self.stdout.write(
+            self.style.SUCCESS("Successfully rebuilt recipe search index")
+        )
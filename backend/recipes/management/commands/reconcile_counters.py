@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from recipes.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчет денормализованных счетчиков рецептов и пользователей. "
+        "Пример команды: python manage.py reconcile_counters"
+    )
+
+    def handle(self, *args, **options):
+        for counter, fixed in reconcile_counters().items():
+            style = self.style.WARNING if fixed else self.style.SUCCESS
+            self.stdout.write(style(f"{counter}: fixed {fixed} rows"))
@@ -0,0 +1,159 @@
+"""
+Учет ссылок на файлы хранилища recipes.storage.
+
+Ссылки из картинок рецептов и аватаров меняются атомарно через F()
+при сохранении и удалении объектов (см. api.signals). Файлы без ссылок
+удаляются командой collect_media_garbage по истечении периода ожидания,
+чтобы не удалить файл, загруженный в еще не завершенной транзакции.
+"""
+from collections import Counter
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from recipes.images import delete_variants
+from recipes.models import FoodgramUser, MediaBlob, Recipe
+from recipes.storage import BLOB_DIR, is_blob
+
+# (модель, поле с файлом)
+MEDIA_FIELDS = (
+    (Recipe, "image"),
+    (FoodgramUser, "avatar"),
+)
+
+
+def get_media_names(instance):
+    """
+    Имена файлов объекта по полям MEDIA_FIELDS.
+    Отложенные поля пропускаем, чтобы не загружать их из базы.
+    """
+    names = {}
+    for model, field_name in MEDIA_FIELDS:
+        if isinstance(instance, model) and field_name in instance.__dict__:
+            value = instance.__dict__[field_name]
+            names[field_name] = getattr(value, "name", value) or ""
+    return names
+
+
+def get_saved_media_names(instance, update_fields=None):
+    """
+    Имена файлов объекта в базе до сохранения: одним запросом по полям,
+    которые загружены и будут сохранены.
+    """
+    fields = [
+        field_name for field_name in get_media_names(instance)
+        if update_fields is None or field_name in update_fields
+    ]
+    if instance._state.adding or not fields:
+        return {}
+    return type(instance).objects.filter(
+        pk=instance.pk
+    ).values(*fields).first() or {}
+
+
+def change_refcount(name, delta):
+    """Изменяем количество ссылок на файл хранилища."""
+    if not is_blob(name):
+        return
+    if delta > 0:
+        MediaBlob.objects.bulk_create(
+            (MediaBlob(name=name),), ignore_conflicts=True
+        )
+        blobs = MediaBlob.objects.filter(name=name)
+    else:
+        blobs = MediaBlob.objects.filter(name=name, refcount__gte=-delta)
+    blobs.update(refcount=F("refcount") + delta, updated_at=timezone.now())
+
+
+def reconcile_refcounts():
+    """
+    Пересчитываем ссылки на файлы по данным и исправляем расхождения.
+    Возвращает количество исправленных записей.
+    """
+    actual = Counter()
+    for model, field_name in MEDIA_FIELDS:
+        references = model.objects.filter(
+            **{f"{field_name}__startswith": f"{BLOB_DIR}/"}
+        ).order_by().values_list(field_name).annotate(total=Count("pk"))
+        for name, total in references:
+            actual[name] += total
+    fixed = 0
+    for blob in MediaBlob.objects.iterator():
+        refcount = actual.pop(blob.name, 0)
+        if blob.refcount != refcount:
+            MediaBlob.objects.filter(pk=blob.pk).update(refcount=refcount)
+            fixed += 1
+    MediaBlob.objects.bulk_create(
+        (
+            MediaBlob(name=name, refcount=refcount)
+            for name, refcount in actual.items()
+        ),
+        ignore_conflicts=True
+    )
+    return fixed + len(actual)
+
+
+def get_blob_files(storage):
+    """Файлы хранилища по хешу содержимого (без каталогов копий)."""
+    if not storage.exists(BLOB_DIR):
+        return
+    shards, _ = storage.listdir(BLOB_DIR)
+    for shard in shards:
+        _, files = storage.listdir(f"{BLOB_DIR}/{shard}")
+        for filename in files:
+            yield f"{BLOB_DIR}/{shard}/{filename}"
+
+
+def delete_blob(storage, name):
+    """Удаляем файл и его уменьшенные копии, возвращаем размер файла."""
+    if not storage.exists(name):
+        return 0
+    size = storage.size(name)
+    delete_variants(storage, name)
+    storage.delete(name)
+    return size
+
+
+def collect_garbage(grace, dry_run=False, storage=default_storage):
+    """
+    Удаляем файлы без ссылок, не менявшиеся дольше grace (timedelta):
+    записи MediaBlob с нулем ссылок и файлы без записей
+    (например, загруженные в откатившейся транзакции).
+
+    Запись удаляется условным DELETE ... WHERE refcount = 0, а файл —
+    только если запись удалена, в той же транзакции. Загрузка того же
+    файла (recipes.storage.pin_blob) ждет ее завершения и записывает
+    файл заново.
+    Возвращает (количество файлов, размер в байтах).
+    """
+    cutoff = timezone.now() - grace
+    count = size = 0
+    unreferenced = MediaBlob.objects.filter(refcount=0, updated_at__lt=cutoff)
+    for pk, name in unreferenced.values_list("pk", "name").iterator():
+        if dry_run:
+            count += 1
+            size += storage.size(name) if storage.exists(name) else 0
+            continue
+        with transaction.atomic():
+            if unreferenced.filter(pk=pk).delete()[0]:
+                count += 1
+                size += delete_blob(storage, name)
+    known = set(MediaBlob.objects.values_list("name", flat=True))
+    for name in get_blob_files(storage):
+        if name in known or storage.get_modified_time(name) >= cutoff:
+            continue
+        if dry_run:
+            count += 1
+            size += storage.size(name)
+            continue
+        # Заводим запись под блокировкой: если файл успели загрузить
+        # повторно, запись уже есть и файл не трогаем
+        with transaction.atomic():
+            blobs = MediaBlob.objects.select_for_update()
+            blob, created = blobs.get_or_create(name=name)
+            if created:
+                count += 1
+                size += delete_blob(storage, name)
+                blob.delete()
+    return count, size
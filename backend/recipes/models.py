@@ -1,7 +1,8 @@
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator, RegexValidator
 from django.db import models
-from django.db.models import F, Q
+from django.db.models import Exists, F, OuterRef, Q, Value
+from django.utils import timezone
 from recipes.constants import (MEASUREMENT_NAME_MAX_LENGTH, MIN_AMOUNT,
                                MIN_COOKING_TIME, NAME_MAX_LENGTH,
                                TAG_NAME_MAX_LENGTH)
@@ -9,9 +10,39 @@ from recipes.constants import (MEASUREMENT_NAME_MAX_LENGTH, MIN_AMOUNT,
 USERNAME_REGEX = r'^[\w.@+-]+$'
 
 
-class FoodgramUser(AbstractUser):
+class CountersModelMixin:
+    """
+    Денормализованные счетчики меняются только атомарно через F()
+    (recipes.counters). Обычное сохранение объекта их не записывает,
+    иначе устаревшее значение в памяти затерло бы эти изменения.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, update_fields=None, **kwargs):
+        if not self._state.adding and not kwargs.get("force_insert"):
+            if update_fields is None:
+                update_fields = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key
+                ]
+            update_fields = [
+                name for name in update_fields
+                if name not in self.counter_fields
+            ]
+        super().save(*args, update_fields=update_fields, **kwargs)
+
+
+class FoodgramUser(CountersModelMixin, AbstractUser):
     """Модель пользователя."""
 
+    counter_fields = (
+        'recipes_count',
+        'favorites_count',
+        'subscriptions_count',
+        'subscribers_count',
+    )
+
     username = models.CharField(
         'Имя пользователя',
         max_length=NAME_MAX_LENGTH,
@@ -26,6 +57,18 @@ class FoodgramUser(AbstractUser):
     last_name = models.CharField('Фамилия', max_length=NAME_MAX_LENGTH)
     email = models.EmailField('Электронная почта', unique=True)
     avatar = models.ImageField('Аватар', upload_to='users', blank=True)
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов', default=0, editable=False
+    )
+    favorites_count = models.PositiveIntegerField(
+        'Количество избранных', default=0, editable=False
+    )
+    subscriptions_count = models.PositiveIntegerField(
+        'Количество подписок', default=0, editable=False
+    )
+    subscribers_count = models.PositiveIntegerField(
+        'Количество подписчиков', default=0, editable=False
+    )
 
     REQUIRED_FIELDS = ('first_name', 'last_name', 'username')
     USERNAME_FIELD = 'email'
@@ -35,9 +78,22 @@ class FoodgramUser(AbstractUser):
         verbose_name_plural = 'пользователи'
         ordering = ('username',)
 
-    @property
-    def favorites_count(self):
-        return self.favorites.count()
+    @classmethod
+    def from_cached_id(cls, user_id):
+        """
+        Пользователь, известный только по id (api.authentication).
+        Остальные поля загружаются одним запросом при первом обращении
+        к любому из них.
+        """
+        user = cls.from_db(None, ('id', 'is_active'), (user_id, True))
+        user._load_deferred_together = True
+        return user
+
+    def refresh_from_db(self, using=None, fields=None):
+        if fields and getattr(self, '_load_deferred_together', False):
+            fields = self.get_deferred_fields()
+            self._load_deferred_together = False
+        super().refresh_from_db(using=using, fields=fields)
 
     @property
     def shopping_list_count(self):
@@ -97,9 +153,45 @@ class Tag(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    """Набор запросов для рецептов."""
+
+    def touch(self):
+        """Отмечаем рецепты как измененные."""
+        return self.update(updated_at=timezone.now())
+
+    def with_related(self):
+        """Подгружаем автора, теги и ингредиенты фиксированным числом
+        запросов."""
+        return self.select_related("author").prefetch_related(
+            "tags", "recipeingredients__ingredient"
+        )
+
+    def with_user_flags(self, user):
+        """Аннотируем признаки is_favorited и is_in_shopping_cart
+        для текущего пользователя."""
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False, output_field=models.BooleanField()),
+                is_in_shopping_cart=Value(
+                    False, output_field=models.BooleanField()
+                ),
+            )
+        return self.annotate(
+            is_favorited=Exists(UserFavorite.objects.filter(
+                user=user, recipe=OuterRef("pk")
+            )),
+            is_in_shopping_cart=Exists(UserShoppingList.objects.filter(
+                user=user, recipe=OuterRef("pk")
+            )),
+        )
+
+
+class Recipe(CountersModelMixin, models.Model):
     """Модель рецептов."""
 
+    counter_fields = ('favorites_count',)
+
     name = models.CharField('Название', max_length=NAME_MAX_LENGTH)
     image = models.ImageField('Картинка', upload_to='recipes/images')
     text = models.TextField('Описание')
@@ -108,6 +200,10 @@ class Recipe(models.Model):
         validators=[MinValueValidator(MIN_COOKING_TIME)]
     )
     created_at = models.DateTimeField('Время добавления', auto_now_add=True)
+    updated_at = models.DateTimeField('Время изменения', auto_now=True)
+    favorites_count = models.PositiveIntegerField(
+        'Количество добавлений в избранное', default=0, editable=False
+    )
     author = models.ForeignKey(
         FoodgramUser,
         verbose_name='Автор',
@@ -126,6 +222,8 @@ class Recipe(models.Model):
         related_name='recipes'
     )
 
+    objects = RecipeQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'рецепт'
         verbose_name_plural = 'Рецепты'
@@ -198,6 +296,35 @@ class UserShoppingList(BaseUserRecipeList):
         verbose_name_plural = 'Списки покупок'
 
 
+class ShoppingCartIngredient(models.Model):
+    """
+    Суммарное количество ингредиента в списке покупок пользователя.
+    Поддерживается инкрементально при изменении списка покупок
+    и рецептов в нем.
+    """
+
+    user = models.ForeignKey(
+        FoodgramUser,
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_ingredients'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient, verbose_name='Ингредиент', on_delete=models.CASCADE
+    )
+    amount = models.IntegerField('Количество')
+
+    class Meta:
+        verbose_name = 'ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_cart_ingredient'
+            )
+        ]
+
+
 class UserSubscriptions(models.Model):
     """Модель для подписок пользователя."""
 
@@ -227,3 +354,21 @@ class UserSubscriptions(models.Model):
         verbose_name = 'подписка'
         verbose_name_plural = 'подписки'
         ordering = ['user', 'author']
+
+
+class MediaBlob(models.Model):
+    """
+    Файл в хранилище по хешу содержимого (recipes.storage)
+    и количество ссылок на него из картинок рецептов и аватаров.
+    """
+
+    name = models.CharField('Имя файла', max_length=100, unique=True)
+    refcount = models.PositiveIntegerField('Количество ссылок', default=0)
+    updated_at = models.DateTimeField('Время изменения', auto_now=True)
+
+    class Meta:
+        verbose_name = 'файл'
+        verbose_name_plural = 'файлы'
+
+    def __str__(self):
+        return self.name
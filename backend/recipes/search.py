@@ -0,0 +1,229 @@
+"""
+Полнотекстовый поиск по рецептам.
+
+Поисковые документы (название, описание и названия ингредиентов)
+хранятся в теневой таблице recipes_recipe_search, которая обновляется
+при записи рецептов. На PostgreSQL это столбец tsvector с GIN-индексом,
+на SQLite — виртуальная таблица FTS5.
+"""
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+SEARCH_TABLE = "recipes_recipe_search"
+# Поля рецепта в поисковом документе (кроме ингредиентов)
+SEARCH_DOCUMENT_FIELDS = frozenset(("name", "text"))
+WORD_RE = re.compile(r"\w+")
+
+
+def _fold(column):
+    """SQL-выражение, заменяющее ё на е."""
+    return f"replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+SOURCE_SQL = f"""
+    SELECT r.id,
+           {_fold('r.name')},
+           {_fold('r.text')},
+           {_fold("coalesce({agg}, '')")}
+    FROM recipes_recipe r
+    LEFT JOIN recipes_recipeingredient ri ON ri.recipe_id = r.id
+    LEFT JOIN recipes_ingredient i ON i.id = ri.ingredient_id
+    {{where}}
+    GROUP BY r.id, r.name, r.text
+"""
+
+
+class PostgresRecipeSearch:
+    """Поиск через tsvector и GIN-индекс."""
+
+    config = "russian"
+
+    def create_schema(self, cursor):
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+            f"recipe_id bigint PRIMARY KEY REFERENCES recipes_recipe(id) "
+            f"ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            f"document tsvector NOT NULL)"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_gin "
+            f"ON {SEARCH_TABLE} USING gin (document)"
+        )
+
+    def update(self, cursor, where, params):
+        source = SOURCE_SQL.format(
+            agg="string_agg(i.name, ' ')", where=where
+        )
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (recipe_id, document) "
+            f"SELECT id, "
+            f"setweight(to_tsvector('{self.config}', name), 'A') || "
+            f"setweight(to_tsvector('{self.config}', description), 'B') || "
+            f"setweight(to_tsvector('{self.config}', ingredients), 'C') "
+            f"FROM ({source}) AS source (id, name, description, ingredients) "
+            f"ON CONFLICT (recipe_id) DO UPDATE "
+            f"SET document = EXCLUDED.document",
+            params
+        )
+
+    def delete(self, cursor, recipe_ids):
+        cursor.execute(
+            f"DELETE FROM {SEARCH_TABLE} WHERE recipe_id = ANY(%s)",
+            (list(recipe_ids),)
+        )
+
+    def make_query(self, words):
+        return " & ".join(f"{word}:*" for word in words)
+
+    def match_sql(self):
+        return (
+            f"SELECT recipe_id FROM {SEARCH_TABLE} "
+            f"WHERE document @@ to_tsquery('{self.config}', %s)"
+        )
+
+    def rank_sql(self, table):
+        return (
+            f"SELECT ts_rank(document, to_tsquery('{self.config}', %s)) "
+            f"FROM {SEARCH_TABLE} WHERE recipe_id = {table}.id"
+        )
+
+
+class SQLiteRecipeSearch:
+    """Поиск через виртуальную таблицу FTS5."""
+
+    # Вес совпадений в названии, описании и ингредиентах для bm25
+    weights = "10.0, 1.0, 3.0"
+
+    def create_schema(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} "
+            f"USING fts5(name, text, ingredients, "
+            f"tokenize='unicode61 remove_diacritics 2')"
+        )
+
+    def update(self, cursor, where, params):
+        source = SOURCE_SQL.format(
+            agg="group_concat(i.name, ' ')", where=where
+        )
+        # Без условия таблица заполняется целиком и уже пуста
+        if where:
+            cursor.execute(
+                f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN "
+                f"(SELECT r.id FROM recipes_recipe r {where})",
+                params
+            )
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, name, text, ingredients) "
+            f"{source}",
+            params
+        )
+
+    def delete(self, cursor, recipe_ids):
+        recipe_ids = list(recipe_ids)
+        placeholders = ", ".join(["%s"] * len(recipe_ids))
+        cursor.execute(
+            f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})",
+            recipe_ids
+        )
+
+    def make_query(self, words):
+        return " ".join(f'"{word}"*' for word in words)
+
+    def match_sql(self):
+        return (
+            f"SELECT rowid FROM {SEARCH_TABLE} "
+            f"WHERE {SEARCH_TABLE} MATCH %s"
+        )
+
+    def rank_sql(self, table):
+        return (
+            f"SELECT -bm25({SEARCH_TABLE}, {self.weights}) "
+            f"FROM {SEARCH_TABLE} "
+            f"WHERE {SEARCH_TABLE} MATCH %s AND rowid = {table}.id"
+        )
+
+
+BACKENDS = {
+    "postgresql": PostgresRecipeSearch,
+    "sqlite": SQLiteRecipeSearch,
+}
+
+
+def get_backend():
+    """Реализация поиска для текущей СУБД или None."""
+    backend_class = BACKENDS.get(connection.vendor)
+    return backend_class() if backend_class else None
+
+
+def create_search_schema():
+    """
+    Создаем теневую таблицу и заполняем её, если она пуста.
+    Возвращаем True, если таблица была заполнена.
+    """
+    backend = get_backend()
+    if backend is None:
+        return False
+    with connection.cursor() as cursor:
+        backend.create_schema(cursor)
+        cursor.execute(f"SELECT 1 FROM {SEARCH_TABLE} LIMIT 1")
+        if cursor.fetchone() is not None:
+            return False
+        backend.update(cursor, "", ())
+    return True
+
+
+def rebuild_search_index():
+    """Полностью перестраиваем поисковые документы всех рецептов."""
+    backend = get_backend()
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        backend.update(cursor, "", ())
+
+
+def update_search_documents(recipe_ids):
+    """Обновляем поисковые документы указанных рецептов."""
+    recipe_ids = list(recipe_ids)
+    backend = get_backend()
+    if backend is None or not recipe_ids:
+        return
+    placeholders = ", ".join(["%s"] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        backend.update(
+            cursor, f"WHERE r.id IN ({placeholders})", recipe_ids
+        )
+
+
+def delete_search_documents(recipe_ids):
+    """Удаляем поисковые документы рецептов."""
+    recipe_ids = list(recipe_ids)
+    backend = get_backend()
+    if backend is None or not recipe_ids:
+        return
+    with connection.cursor() as cursor:
+        backend.delete(cursor, recipe_ids)
+
+
+def search_recipes(recipes, term):
+    """
+    Отбираем рецепты, соответствующие поисковому запросу,
+    и сортируем их по релевантности.
+    """
+    words = WORD_RE.findall(term.replace("ё", "е").replace("Ё", "Е"))
+    backend = get_backend()
+    if not words:
+        return recipes
+    if backend is None:
+        for word in words:
+            recipes = recipes.filter(name__icontains=word)
+        return recipes
+    query = backend.make_query(words)
+    table = recipes.model._meta.db_table
+    return recipes.filter(
+        id__in=RawSQL(backend.match_sql(), (query,))
+    ).annotate(
+        search_rank=RawSQL(backend.rank_sql(table), (query,))
+    ).order_by("-search_rank", "-created_at")
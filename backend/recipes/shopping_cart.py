@@ -0,0 +1,168 @@
+"""
+Инкрементальное обновление суммарных ингредиентов списков покупок.
+
+Таблица ShoppingCartIngredient хранит для каждого пользователя сумму
+количеств ингредиентов по всем рецептам его списка покупок.
+Она обновляется при добавлении и удалении рецептов из списка
+и при изменении ингредиентов рецептов, которые уже в чьих-то списках.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from recipes.models import (RecipeIngredient, ShoppingCartIngredient,
+                            UserShoppingList)
+
+
+def get_recipe_amounts(recipe_id):
+    """Количества ингредиентов рецепта: {ingredient_id: amount}."""
+    return dict(
+        RecipeIngredient.objects.filter(recipe_id=recipe_id).values_list(
+            "ingredient_id", "amount"
+        )
+    )
+
+
+def get_amounts_delta(old_amounts, new_amounts):
+    """Разница количеств ингредиентов до и после изменения."""
+    delta = Counter(new_amounts)
+    delta.subtract(old_amounts)
+    return {
+        ingredient_id: amount
+        for ingredient_id, amount in delta.items() if amount
+    }
+
+
+@transaction.atomic(savepoint=False)
+def apply_delta(user_ids, delta, new_ingredient_ids=None):
+    """
+    Прибавляем delta к суммарным ингредиентам пользователей.
+    Строки создаются для ингредиентов new_ingredient_ids (по умолчанию
+    для всех с положительной разницей), для остальных они уже есть.
+    """
+    user_ids = list(user_ids)
+    if not user_ids or not delta:
+        return
+    if new_ingredient_ids is None:
+        new_ingredient_ids = delta.keys()
+    ShoppingCartIngredient.objects.bulk_create(
+        (
+            ShoppingCartIngredient(
+                user_id=user_id, ingredient_id=ingredient_id, amount=0
+            )
+            for user_id in user_ids
+            for ingredient_id, amount in delta.items()
+            if amount > 0 and ingredient_id in new_ingredient_ids
+        ),
+        ignore_conflicts=True
+    )
+    rows = ShoppingCartIngredient.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=delta
+    )
+    rows.update(amount=F("amount") + Case(
+        *(
+            When(ingredient_id=ingredient_id, then=Value(amount))
+            for ingredient_id, amount in delta.items()
+        ),
+        output_field=IntegerField()
+    ))
+    if any(amount < 0 for amount in delta.values()):
+        rows.filter(amount__lte=0).delete()
+
+
+def add_recipe_to_cart(user_id, recipe_id, sign=1):
+    """Учитываем добавление (или удаление при sign=-1) рецепта."""
+    apply_delta(
+        (user_id,),
+        {
+            ingredient_id: sign * amount
+            for ingredient_id, amount in get_recipe_amounts(recipe_id).items()
+        }
+    )
+
+
+def add_recipes_to_cart(user_id, recipe_ids, sign=1):
+    """
+    Учитываем добавление (или удаление при sign=-1) нескольких рецептов:
+    количества ингредиентов суммируются одним запросом.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    apply_delta(
+        (user_id,),
+        {
+            ingredient_id: sign * total
+            for ingredient_id, total in RecipeIngredient.objects.filter(
+                recipe_id__in=recipe_ids
+            ).values("ingredient_id").annotate(
+                total=Sum("amount")
+            ).order_by().values_list("ingredient_id", "total")
+        }
+    )
+
+
+def update_recipe_in_carts(recipe_id, old_amounts, new_amounts=None):
+    """
+    Учитываем изменение ингредиентов рецепта во всех списках покупок,
+    где он есть. old_amounts и new_amounts — количества до и после
+    изменения; new_amounts по умолчанию читаются из базы.
+    """
+    if new_amounts is None:
+        new_amounts = get_recipe_amounts(recipe_id)
+    delta = get_amounts_delta(old_amounts, new_amounts)
+    if delta:
+        # Ингредиенты рецепта из списка покупок в суммах уже есть
+        apply_delta(
+            UserShoppingList.objects.filter(recipe_id=recipe_id).values_list(
+                "user_id", flat=True
+            ),
+            delta,
+            new_ingredient_ids=new_amounts.keys() - old_amounts.keys()
+        )
+
+
+def get_expected_amounts():
+    """
+    Суммарные ингредиенты, посчитанные заново по спискам покупок:
+    {(user_id, ingredient_id): amount}.
+    """
+    return {
+        (row["user_id"], row["ingredient_id"]): row["total"]
+        for row in UserShoppingList.objects.filter(
+            recipe__recipeingredients__isnull=False
+        ).values(
+            "user_id",
+            ingredient_id=F("recipe__recipeingredients__ingredient_id")
+        ).annotate(
+            total=Sum("recipe__recipeingredients__amount")
+        ).order_by().iterator()
+    }
+
+
+def get_stored_amounts():
+    """Суммарные ингредиенты из таблицы: {(user_id, ingredient_id): amount}."""
+    return {
+        (user_id, ingredient_id): amount
+        for user_id, ingredient_id, amount
+        in ShoppingCartIngredient.objects.values_list(
+            "user_id", "ingredient_id", "amount"
+        ).iterator()
+    }
+
+
+@transaction.atomic
+def rebuild_shopping_carts(batch_size=1000):
+    """Перестраиваем таблицу суммарных ингредиентов с нуля."""
+    ShoppingCartIngredient.objects.all().delete()
+    expected = get_expected_amounts()
+    ShoppingCartIngredient.objects.bulk_create(
+        (
+            ShoppingCartIngredient(
+                user_id=user_id, ingredient_id=ingredient_id, amount=amount
+            )
+            for (user_id, ingredient_id), amount in expected.items()
+        ),
+        batch_size=batch_size
+    )
+    return len(expected)
@@ -0,0 +1,84 @@
+"""
+Хранилище медиафайлов с адресацией по содержимому.
+
+Файлы, загружаемые в каталоги MEDIA_CONTENT_ADDRESSED_DIRS (картинки
+рецептов и аватары), сохраняются под именем
+blobs/<первые два символа хеша>/<sha256><расширение>. Одинаковые
+загрузки хранят один файл, а содержимое по ссылке никогда не меняется,
+поэтому nginx отдает такие файлы с бессрочным кэшированием.
+Ссылки на файлы считаются в recipes.media. Перед записью файл
+закрепляется за транзакцией сохранения (pin_blob), поэтому сборка
+мусора не удалит файл, который повторно загружают в этот момент.
+Остальные файлы (например, копии из recipes.images) сохраняются
+под своими именами.
+"""
+import hashlib
+import os
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils import timezone
+from recipes.models import MediaBlob
+
+BLOB_DIR = "blobs"
+
+
+def is_blob(name):
+    """Файл сохранен по хешу содержимого."""
+    return bool(name) and name.startswith(f"{BLOB_DIR}/")
+
+
+def get_blob_name(name, content):
+    """Имя файла по хешу содержимого с расширением исходного имени."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    digest = digest.hexdigest()
+    extension = os.path.splitext(name)[1].lower()
+    return f"{BLOB_DIR}/{digest[:2]}/{digest}{extension}"
+
+
+def pin_blob(name):
+    """
+    Закрепляем файл за текущей транзакцией: UPDATE блокирует запись
+    (как select_for_update) до конца транзакции и продлевает период
+    ожидания перед сборкой мусора. Сборка мусора удаляет запись и файл
+    в одной транзакции, так что после pin_blob файл либо уже удален
+    вместе с записью, либо не будет удален до увеличения количества
+    ссылок при сохранении объекта.
+    """
+    MediaBlob.objects.bulk_create(
+        (MediaBlob(name=name),), ignore_conflicts=True
+    )
+    MediaBlob.objects.select_for_update().filter(name=name).update(
+        updated_at=timezone.now()
+    )
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage с дедупликацией загрузок по хешу содержимого."""
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if os.path.dirname(name) not in settings.MEDIA_CONTENT_ADDRESSED_DIRS:
+            return super().save(name, content, max_length)
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        blob_name = get_blob_name(name, content)
+        # Вне транзакции блокировка держится только до конца блока,
+        # дальше файл защищает период ожидания сборки мусора
+        with transaction.atomic(savepoint=False):
+            pin_blob(blob_name)
+            if not self.exists(blob_name):
+                # Пишем во временный файл и атомарно переименовываем:
+                # параллельная загрузка того же файла не увидит его
+                # недописанным, а повторная запись дает то же содержимое
+                temporary_name = self._save(
+                    f"{blob_name}.{uuid4().hex}.tmp", content
+                )
+                os.replace(self.path(temporary_name), self.path(blob_name))
+        return blob_name
@@ -0,0 +1,124 @@
+"""
+Пакетное добавление и удаление рецептов в избранном и списке покупок.
+
+Строки пишутся одним bulk_create (без сигналов) и удаляются через
+QuerySet.delete() внутри bulk_change: обработчики сигналов удаления
+(api.signals) в нем ничего не делают. Счетчики (recipes.counters)
+и суммарные ингредиенты списков покупок (recipes.shopping_cart)
+обновляются здесь явно, поэтому количество запросов не зависит
+от количества рецептов.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from recipes.counters import change_counters_bulk
+from recipes.models import FoodgramUser, Recipe, UserShoppingList
+from recipes.shopping_cart import add_recipes_to_cart
+
+# Результаты для каждого рецепта
+ADDED = "added"
+ALREADY_ADDED = "already_added"
+REMOVED = "removed"
+NOT_ADDED = "not_added"
+NOT_FOUND = "not_found"
+
+# Модель списка, которую сейчас пакетно меняет текущий поток
+_bulk_model = ContextVar("bulk_model", default=None)
+
+
+@contextmanager
+def bulk_change(model):
+    """Сигналы строк model внутри блока обрабатываются пакетно."""
+    token = _bulk_model.set(model)
+    try:
+        yield
+    finally:
+        _bulk_model.reset(token)
+
+
+def in_bulk_change(instance):
+    """Строка меняется пакетно: обработчик сигнала ее пропускает."""
+    return type(instance) is _bulk_model.get()
+
+
+def lock_user(user):
+    """
+    Блокируем строку пользователя до конца транзакции: изменения
+    списков одного пользователя (пакетные и одиночные) выполняются
+    по очереди.
+    """
+    list(FoodgramUser.objects.select_for_update().filter(
+        pk=user.pk
+    ).values_list("pk"))
+
+
+def get_existing_ids(recipe_ids):
+    return set(
+        Recipe.objects.filter(id__in=recipe_ids).values_list("id", flat=True)
+    )
+
+
+@transaction.atomic
+def add_recipes(model, user, recipe_ids):
+    """
+    Добавляем рецепты в список model (UserFavorite или UserShoppingList)
+    пользователя. Возвращаем {recipe_id: результат} в порядке запроса.
+    """
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    lock_user(user)
+    existing = get_existing_ids(recipe_ids)
+    present = set(model.objects.filter(
+        user=user, recipe_id__in=existing
+    ).values_list("recipe_id", flat=True))
+    added = [
+        recipe_id for recipe_id in recipe_ids
+        if recipe_id in existing and recipe_id not in present
+    ]
+    rows = model.objects.bulk_create(
+        model(user=user, recipe_id=recipe_id) for recipe_id in added
+    )
+    change_counters_bulk(model, rows, 1)
+    if model is UserShoppingList:
+        add_recipes_to_cart(user.id, added)
+    return {
+        recipe_id: (
+            NOT_FOUND if recipe_id not in existing
+            else ALREADY_ADDED if recipe_id in present
+            else ADDED
+        )
+        for recipe_id in recipe_ids
+    }
+
+
+@transaction.atomic
+def remove_recipes(model, user, recipe_ids):
+    """
+    Удаляем рецепты из списка model пользователя.
+    Возвращаем {recipe_id: результат} в порядке запроса.
+    """
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    lock_user(user)
+    rows = model.objects.filter(user=user, recipe_id__in=recipe_ids)
+    present = set(rows.values_list("recipe_id", flat=True))
+    missing = set(recipe_ids) - present
+    existing = present | (get_existing_ids(missing) if missing else set())
+    if present:
+        if model is UserShoppingList:
+            # До удаления, как сигнал pre_delete
+            add_recipes_to_cart(user.id, present, sign=-1)
+        with bulk_change(model):
+            rows.delete()
+        change_counters_bulk(
+            model,
+            [model(user=user, recipe_id=recipe_id) for recipe_id in present],
+            -1
+        )
+    return {
+        recipe_id: (
+            REMOVED if recipe_id in present
+            else NOT_ADDED if recipe_id in existing
+            else NOT_FOUND
+        )
+        for recipe_id in recipe_ids
+    }
@@ -0,0 +1,109 @@
+import pytest
+from api.ingredient_index import ingredient_index
+from django.core.cache import cache
+from recipes.models import (FoodgramUser, Ingredient, Recipe,
+                            RecipeIngredient, Tag, UserFavorite,
+                            UserShoppingList, UserSubscriptions)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+AUTHORS = 7
+RECIPES_PER_AUTHOR = 6
+TAGS = 3
+INGREDIENTS = 10
+INGREDIENTS_PER_RECIPE = 3
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """Снимки справочников и индекс ингредиентов живут между тестами."""
+    cache.clear()
+    ingredient_index.invalidate()
+    yield
+    cache.clear()
+    ingredient_index.invalidate()
+
+
+@pytest.fixture
+def dataset(db):
+    """
+    Фиксированный набор данных: читатель, подписанный на всех авторов,
+    по шесть рецептов у каждого автора, часть рецептов в избранном
+    и в списке покупок читателя.
+    """
+    reader = FoodgramUser.objects.create_user(
+        username="reader", email="reader@foodgram.ru",
+        first_name="Читатель", last_name="Тестовый", password="password"
+    )
+    authors = [
+        FoodgramUser.objects.create_user(
+            username=f"author{index}", email=f"author{index}@foodgram.ru",
+            first_name=f"Автор{index}", last_name="Тестовый",
+            password="password"
+        )
+        for index in range(AUTHORS)
+    ]
+    tags = [
+        Tag.objects.create(name=f"Тег {index}", slug=f"tag{index}")
+        for index in range(TAGS)
+    ]
+    ingredients = [
+        Ingredient.objects.create(
+            name=f"ингредиент {index}", measurement_unit="г"
+        )
+        for index in range(INGREDIENTS)
+    ]
+    recipes = []
+    for index in range(AUTHORS * RECIPES_PER_AUTHOR):
+        recipe = Recipe.objects.create(
+            author=authors[index % AUTHORS],
+            name=f"Рецепт {index}",
+            text="Описание рецепта",
+            image="recipes/images/recipe.png",
+            cooking_time=10 + index,
+        )
+        recipe.tags.set([tags[index % TAGS], tags[(index + 1) % TAGS]])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=ingredients[(index + offset) % INGREDIENTS],
+                amount=100 + offset
+            )
+            for offset in range(INGREDIENTS_PER_RECIPE)
+        )
+        recipes.append(recipe)
+    for author in authors:
+        UserSubscriptions.objects.create(user=reader, author=author)
+    for recipe in recipes[::2]:
+        UserFavorite.objects.create(user=reader, recipe=recipe)
+        UserShoppingList.objects.create(user=reader, recipe=recipe)
+    return {
+        "reader": reader,
+        "authors": authors,
+        "tags": tags,
+        "ingredients": ingredients,
+        "recipes": recipes,
+    }
+
+
+@pytest.fixture
+def anon_client():
+    return APIClient()
+
+
+@pytest.fixture
+def reader_client(dataset):
+    """Клиент читателя, авторизованный токеном, как фронтенд."""
+    client = APIClient()
+    token = Token.objects.create(user=dataset["reader"])
+    client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+    return client
+
+
+@pytest.fixture
+def author_client(dataset):
+    """Клиент автора первых рецептов."""
+    client = APIClient()
+    token = Token.objects.create(user=dataset["authors"][0])
+    client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+    return client
@@ -0,0 +1,23 @@
+"""Настройки для запуска тестов: SQLite в памяти и временный MEDIA_ROOT."""
+import os
+import tempfile
+
+os.environ.setdefault('SECRET_KEY', 'foodgram-tests')
+
+from backend.settings import *  # noqa: E402,F401,F403
+
+DEBUG = False
+ALLOWED_HOSTS = ['testserver']
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='foodgram-media-')
+METRICS_DIR = tempfile.mkdtemp(prefix='foodgram-metrics-')
+SQL_INSTRUMENTATION_ENABLED = False
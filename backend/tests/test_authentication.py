@@ -0,0 +1,111 @@
+"""Кэширование пользователя по токену и сброс кэша."""
+from api.authentication import get_token_cache_key
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from recipes.models import FoodgramUser
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+ME_URL = "/api/users/me/"
+
+
+def get_client(user):
+    client = APIClient()
+    token, _ = Token.objects.get_or_create(user=user)
+    client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+    return client
+
+
+def test_token_lookup_is_cached(dataset):
+    client = get_client(dataset["reader"])
+    assert client.get(ME_URL).status_code == 200
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(ME_URL)
+    assert response.status_code == 200
+    assert response.data["email"] == "reader@foodgram.ru"
+    assert not any(
+        "authtoken_token" in query["sql"]
+        for query in context.captured_queries
+    )
+
+
+def test_logout_invalidates_token(dataset):
+    client = get_client(dataset["reader"])
+    assert client.get(ME_URL).status_code == 200
+    assert client.post("/api/auth/token/logout/").status_code == 204
+    assert client.get(ME_URL).status_code == 401
+
+
+def test_deactivation_invalidates_token(dataset):
+    reader = dataset["reader"]
+    client = get_client(reader)
+    assert client.get(ME_URL).status_code == 200
+    reader.is_active = False
+    reader.save()
+    assert client.get(ME_URL).status_code == 401
+
+
+def test_password_change_refreshes_user(dataset):
+    client = get_client(dataset["reader"])
+    assert client.post("/api/users/set_password/", {
+        "current_password": "password", "new_password": "Sup3r-secret"
+    }).status_code == 204
+    response = client.post("/api/users/set_password/", {
+        "current_password": "Sup3r-secret", "new_password": "An0ther-secret"
+    })
+    assert response.status_code == 204
+    assert FoodgramUser.objects.get(
+        id=dataset["reader"].id
+    ).check_password("An0ther-secret")
+
+
+def test_profile_change_is_visible(dataset):
+    reader = dataset["reader"]
+    client = get_client(reader)
+    assert client.get(ME_URL).status_code == 200
+    reader.first_name = "Новое имя"
+    reader.save()
+    assert client.get(ME_URL).data["first_name"] == "Новое имя"
+
+
+def test_cache_holds_user_id_only(dataset):
+    reader = dataset["reader"]
+    client = get_client(reader)
+    assert client.get(ME_URL).status_code == 200
+    key = Token.objects.get(user=reader).key
+    assert cache.get(get_token_cache_key(key)) == reader.id
+    # Пользователь загружается заново: изменения видны сразу
+    FoodgramUser.objects.filter(id=reader.id).update(last_name="Свежая")
+    assert client.get(ME_URL).data["last_name"] == "Свежая"
+
+
+def test_cached_token_skips_user_query(dataset):
+    client = get_client(dataset["reader"])
+    url = "/api/recipes/download_shopping_cart/?format=json"
+    assert client.get(url).status_code == 200
+    with CaptureQueriesContext(connection) as context:
+        assert client.get(url).status_code == 200
+    assert not any(
+        "recipes_foodgramuser" in query["sql"]
+        for query in context.captured_queries
+    )
+
+
+def test_cached_user_loads_fields_in_one_query(dataset):
+    reader = dataset["reader"]
+    user = FoodgramUser.from_cached_id(reader.id)
+    with CaptureQueriesContext(connection) as context:
+        assert user.email == "reader@foodgram.ru"
+        assert user.username == reader.username
+        assert user.avatar == reader.avatar
+    assert len(context.captured_queries) == 1
+
+
+def test_deactivation_with_update_fields_invalidates_token(dataset):
+    reader = dataset["reader"]
+    client = get_client(reader)
+    assert client.get(ME_URL).status_code == 200
+    reader.is_active = False
+    reader.save(update_fields=["is_active"])
+    assert client.get(ME_URL).status_code == 401
@@ -0,0 +1,111 @@
+"""Пакетные действия с избранным, списком покупок и выборка по id."""
+import pytest
+from recipes.counters import reconcile_counters
+from recipes.models import UserFavorite, UserShoppingList
+from recipes.shopping_cart import get_expected_amounts, get_stored_amounts
+
+from tests.test_query_budgets import check_budget
+
+MISSING_ID = 999
+
+
+@pytest.mark.parametrize("action, model, max_queries", (
+    ("favorite", UserFavorite, 9),
+    ("shopping_cart", UserShoppingList, 12),
+))
+def test_bulk_add_remove(reader_client, dataset, action, model,
+                         max_queries):
+    recipes = dataset["recipes"]
+    # Прогрев кэша токенов
+    reader_client.get("/api/users/me/")
+    counts = []
+    for size in (2, 6):
+        ids = [recipe.id for recipe in recipes[1:size * 2:2]]
+        # Рецепт recipes[0] уже в списке читателя
+        payload = {"ids": ids + [recipes[0].id, MISSING_ID]}
+        url = f"/api/recipes/{action}/"
+        response, queries = check_budget(
+            reader_client, "post", url, max_queries, 600, data=payload
+        )
+        assert response.data["results"] == [
+            {"id": recipe_id, "result": "added"} for recipe_id in ids
+        ] + [
+            {"id": recipes[0].id, "result": "already_added"},
+            {"id": MISSING_ID, "result": "not_found"},
+        ]
+        assert model.objects.filter(
+            user=dataset["reader"], recipe_id__in=ids
+        ).count() == size
+        counts.append(len(queries))
+
+        payload = {"ids": ids + [recipes[-1].id, MISSING_ID]}
+        response, queries = check_budget(
+            reader_client, "delete", url, max_queries, 600, data=payload
+        )
+        assert response.data["results"] == [
+            {"id": recipe_id, "result": "removed"} for recipe_id in ids
+        ] + [
+            {"id": recipes[-1].id, "result": "not_added"},
+            {"id": MISSING_ID, "result": "not_found"},
+        ]
+        assert not model.objects.filter(
+            user=dataset["reader"], recipe_id__in=ids
+        ).exists()
+        counts.append(len(queries))
+    assert counts[:2] == counts[2:], counts
+    assert not any(reconcile_counters().values())
+    assert get_stored_amounts() == get_expected_amounts()
+
+
+def test_bulk_counters_and_cart(reader_client, dataset):
+    ids = [recipe.id for recipe in dataset["recipes"][1:12:2]]
+    reader_client.post(
+        "/api/recipes/favorite/", {"ids": ids}, format="json"
+    )
+    reader_client.post(
+        "/api/recipes/shopping_cart/", {"ids": ids}, format="json"
+    )
+    assert not any(reconcile_counters().values())
+    assert get_stored_amounts() == get_expected_amounts()
+
+
+@pytest.mark.parametrize("payload", ({}, {"ids": []}, {"ids": ["x"]}))
+def test_bulk_validation(reader_client, payload):
+    response = reader_client.post(
+        "/api/recipes/favorite/", payload, format="json"
+    )
+    assert response.status_code == 400
+
+
+def test_bulk_requires_authentication(anon_client, dataset):
+    response = anon_client.post(
+        "/api/recipes/favorite/", {"ids": [dataset["recipes"][0].id]},
+        format="json"
+    )
+    assert response.status_code == 401
+
+
+def test_multi_get(reader_client, dataset):
+    recipes = dataset["recipes"]
+    # Прогрев кэша токенов
+    reader_client.get("/api/users/me/")
+    counts = []
+    for size in (2, 6):
+        ids = [recipe.id for recipe in recipes[:size]]
+        response, queries = check_budget(
+            reader_client, "get",
+            f"/api/recipes/?ids={','.join(map(str, ids + [MISSING_ID]))}",
+            7, 4800
+        )
+        assert sorted(
+            recipe["id"] for recipe in response.data["results"]
+        ) == ids
+        counts.append(len(queries))
+    assert counts[0] == counts[1]
+
+
+def test_multi_get_limits_ids(anon_client, settings):
+    ids = ",".join(map(str, range(1, settings.RECIPES_BULK_MAX_IDS + 2)))
+    response = anon_client.get(f"/api/recipes/?ids={ids}")
+    assert response.status_code == 400
+    assert "ids" in response.data
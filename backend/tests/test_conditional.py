@@ -0,0 +1,26 @@
+"""Условные запросы к рецептам: ETag и Last-Modified."""
+
+
+def test_list_etag_changes_on_delete(anon_client, author_client, dataset):
+    url = "/api/recipes/?author={}".format(dataset["authors"][0].id)
+    response = anon_client.get(url)
+    etag = response["ETag"]
+    # Удаление не меняет наибольшее время изменения
+    assert not response.has_header("Last-Modified")
+    assert anon_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    recipe = dataset["recipes"][0]
+    response = author_client.delete(f"/api/recipes/{recipe.id}/")
+    assert response.status_code == 204
+    response = anon_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert recipe.id not in [item["id"] for item in response.data["results"]]
+
+
+def test_detail_last_modified(anon_client, dataset):
+    response = anon_client.get(f"/api/recipes/{dataset['recipes'][0].id}/")
+    assert response.has_header("Last-Modified")
+
+
+def test_detail_invalid_id_is_not_found(anon_client, dataset):
+    assert anon_client.get("/api/recipes/abc/").status_code == 404
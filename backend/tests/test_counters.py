@@ -0,0 +1,23 @@
+"""Денормализованные счетчики не затираются сохранением объектов."""
+from recipes.models import FoodgramUser
+
+from tests.test_query_budgets import IMAGE
+
+
+def test_user_save_keeps_counters(author_client, dataset):
+    author, other = dataset["authors"][:2]
+    # Пользователь попадает в кэш токенов до изменения счетчика
+    author_client.get("/api/users/me/")
+    response = author_client.post(f"/api/users/{other.id}/subscribe/")
+    assert response.status_code == 201
+
+    author_client.put(
+        "/api/users/me/avatar/", {"avatar": IMAGE}, format="json"
+    )
+    author_client.delete("/api/users/me/avatar/")
+    author.save()
+
+    author.refresh_from_db()
+    assert author.subscriptions_count == 1
+    assert author.recipes_count > 0
+    assert FoodgramUser.objects.get(id=other.id).subscribers_count == 2
@@ -0,0 +1,46 @@
+"""Индекс ингредиентов в памяти процесса."""
+from api.ingredient_index import IngredientIndex
+from recipes.models import Ingredient
+
+
+def search(index, term):
+    return [ingredient.name for ingredient in index.search(term)]
+
+
+def test_prefix_then_substring_matches(db):
+    Ingredient.objects.bulk_create(
+        Ingredient(name=name, measurement_unit="г")
+        for name in ("Ёжевика", "масло сливочное", "сливки", "соль")
+    )
+    index = IngredientIndex()
+    assert search(index, "сли") == ["сливки", "масло сливочное"]
+    assert search(index, "ежевик") == ["Ёжевика"]
+    assert search(index, "оль") == ["соль"]
+    # Короткий запрос ищется только по началу названия
+    assert search(index, "ль") == []
+    assert search(index, "с") == ["сливки", "соль"]
+    assert search(index, "сливоч") == ["масло сливочное"]
+    assert search(index, "молоко") == []
+
+
+def test_search_limit(db, settings):
+    settings.INGREDIENT_SEARCH_LIMIT = 3
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f"{prefix}соль {index}", measurement_unit="г")
+        for prefix in ("", "морская ")
+        for index in range(2)
+    )
+    index = IngredientIndex()
+    assert search(index, "соль") == ["соль 0", "соль 1", "морская соль 0"]
+    assert len(search(index, "с")) == 2
+
+
+def test_invalidation_reaches_other_processes(db):
+    # Два индекса с общим кэшем — как в двух воркерах
+    index, other_index = IngredientIndex(), IngredientIndex()
+    assert search(index, "соль") == search(other_index, "соль") == []
+    Ingredient.objects.bulk_create(
+        (Ingredient(name="соль", measurement_unit="г"),)
+    )
+    index.invalidate()
+    assert search(other_index, "соль") == ["соль"]
@@ -0,0 +1,119 @@
+"""Хранилище по хешу содержимого, учет ссылок и сборка мусора."""
+from datetime import timedelta
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.utils import timezone
+from recipes.images import generate_variants, get_variant_name
+from recipes.media import collect_garbage
+from recipes.models import MediaBlob, Recipe
+
+from tests.test_query_budgets import IMAGE, get_recipe_data
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    """Отдельный каталог, чтобы сборка мусора видела только файлы теста."""
+    settings.MEDIA_ROOT = str(tmp_path)
+
+
+def get_refcount(name):
+    return MediaBlob.objects.get(name=name).refcount
+
+
+def create_recipe(client, dataset):
+    response = client.post(
+        "/api/recipes/", get_recipe_data(dataset, 2), format="json"
+    )
+    assert response.status_code == 201, response.data
+    return Recipe.objects.get(id=response.data["id"])
+
+
+def test_identical_uploads_share_blob(author_client, dataset):
+    first = create_recipe(author_client, dataset)
+    second = create_recipe(author_client, dataset)
+    name = first.image.name
+    assert name.startswith("blobs/")
+    assert second.image.name == name
+    assert get_refcount(name) == 2
+    assert default_storage.exists(name)
+
+    author_client.delete(f"/api/recipes/{first.id}/")
+    assert get_refcount(name) == 1
+    assert default_storage.exists(name)
+
+
+def test_other_files_keep_names():
+    name = default_storage.save(
+        "recipes/images/card/a.webp", ContentFile(b"1")
+    )
+    assert name == "recipes/images/card/a.webp"
+    default_storage.delete(name)
+
+
+def test_avatar_replace_and_delete(reader_client, dataset):
+    reader_client.put(
+        "/api/users/me/avatar/", {"avatar": IMAGE}, format="json"
+    )
+    reader = dataset["reader"]
+    reader.refresh_from_db()
+    name = reader.avatar.name
+    assert get_refcount(name) == 1
+
+    response = reader_client.delete("/api/users/me/avatar/")
+    assert response.status_code == 204
+    assert get_refcount(name) == 0
+    # Файл удаляется только сборкой мусора
+    assert default_storage.exists(name)
+
+
+def test_collect_garbage(author_client, dataset):
+    kept = create_recipe(author_client, dataset)
+    dropped = create_recipe(author_client, dataset)
+    dropped.image = ContentFile(b"other image", name="other.png")
+    dropped.save()
+    unreferenced = dropped.image.name
+    dropped.delete()
+    generate_variants(kept.image)
+    orphan = default_storage.save("users/orphan.png", ContentFile(b"orphan"))
+
+    # Период ожидания защищает свежие файлы
+    assert collect_garbage(timedelta(hours=1)) == (0, 0)
+    assert collect_garbage(timedelta(0), dry_run=True)[0] == 2
+    assert default_storage.exists(unreferenced)
+
+    call_command("collect_media_garbage", grace_minutes=0)
+    assert not default_storage.exists(unreferenced)
+    assert not default_storage.exists(orphan)
+    assert not MediaBlob.objects.filter(name=unreferenced).exists()
+    assert default_storage.exists(kept.image.name)
+    assert default_storage.exists(
+        get_variant_name(kept.image.name, "card", "webp")
+    )
+
+
+@pytest.mark.parametrize("refcount", (0, 5))
+def test_reconcile_refcounts(author_client, dataset, refcount):
+    recipe = create_recipe(author_client, dataset)
+    MediaBlob.objects.filter(name=recipe.image.name).update(refcount=refcount)
+    call_command("collect_media_garbage", grace_minutes=0)
+    assert get_refcount(recipe.image.name) == 1
+    assert default_storage.exists(recipe.image.name)
+
+
+def test_reupload_pins_unreferenced_blob(author_client, dataset):
+    recipe = create_recipe(author_client, dataset)
+    name = recipe.image.name
+    author_client.delete(f"/api/recipes/{recipe.id}/")
+    MediaBlob.objects.filter(name=name).update(
+        updated_at=timezone.now() - timedelta(hours=2)
+    )
+
+    # Повторная загрузка до сборки мусора продлевает период ожидания
+    with default_storage.open(name) as image:
+        default_storage.save("recipes/images/again.png", image)
+    assert collect_garbage(timedelta(hours=1)) == (0, 0)
+    assert default_storage.exists(name)
+    assert get_refcount(name) == 0
@@ -0,0 +1,269 @@
+"""
+Бюджеты запросов к базе и размера ответа для каждого маршрута API.
+
+Бюджет — максимальное количество SQL-запросов и размер тела ответа
+в байтах на фиксированном наборе данных (см. conftest.dataset).
+Списки проверяются на двух размерах страницы: количество запросов
+не должно зависеть от количества объектов на странице.
+"""
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from recipes.models import Recipe, UserFavorite, UserShoppingList
+
+PAGE_SIZES = (2, 6)
+
+# Прозрачный PNG 1x1
+IMAGE = (
+    "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA"
+    "DUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+)
+
+# (клиент, адрес, запросов, байт)
+READ_ROUTES = [
+    ("anon_client", "/api/tags/", 1, 200),
+    ("anon_client", "/api/tags/{tag}/", 1, 100),
+    ("anon_client", "/api/ingredients/", 1, 800),
+    ("anon_client", "/api/ingredients/?name=ингр", 1, 800),
+    ("anon_client", "/api/ingredients/{ingredient}/", 1, 100),
+    ("anon_client", "/api/recipes/{recipe}/", 5, 800),
+    ("reader_client", "/api/recipes/{recipe}/", 7, 800),
+    ("anon_client", "/api/recipes/{recipe}/get-link/", 1, 100),
+    ("anon_client", "/api/users/{author}/", 1, 200),
+    ("reader_client", "/api/users/{author}/", 3, 200),
+    ("reader_client", "/api/users/me/", 1, 200),
+    ("reader_client", "/api/recipes/download_shopping_cart/", 3, 1000),
+    (
+        "reader_client", "/api/recipes/download_shopping_cart/?format=csv",
+        2, 400
+    ),
+    (
+        "reader_client", "/api/recipes/download_shopping_cart/?format=json",
+        3, 1400
+    ),
+]
+
+# (клиент, адрес с {limit}, запросов, байт на большей странице)
+LIST_ROUTES = [
+    ("anon_client", "/api/recipes/?limit={limit}", 6, 4800),
+    ("reader_client", "/api/recipes/?limit={limit}", 7, 4800),
+    (
+        "reader_client",
+        "/api/recipes/?limit={limit}&is_favorited=1&tags=tag0&tags=tag1",
+        8, 4800
+    ),
+    (
+        "reader_client", "/api/recipes/?limit={limit}&is_in_shopping_cart=1",
+        7, 4800
+    ),
+    (
+        "reader_client", "/api/recipes/?limit={limit}&author={author}",
+        7, 4800
+    ),
+    (
+        "reader_client", "/api/recipes/?limit={limit}&pagination=cursor",
+        6, 4900
+    ),
+    ("anon_client", "/api/users/?limit={limit}", 2, 1200),
+    ("reader_client", "/api/users/?limit={limit}", 3, 1200),
+    (
+        "reader_client", "/api/users/subscriptions/?limit={limit}",
+        4, 5500
+    ),
+    (
+        "reader_client",
+        "/api/users/subscriptions/?limit={limit}&recipes_limit=2",
+        4, 2600
+    ),
+]
+
+
+def get_url(template, dataset, **kwargs):
+    return template.format(
+        tag=dataset["tags"][0].id,
+        ingredient=dataset["ingredients"][0].id,
+        recipe=dataset["recipes"][0].id,
+        author=dataset["authors"][0].id,
+        **kwargs
+    )
+
+
+def measure(client, method, url, data=None):
+    """Выполняем запрос и считаем SQL-запросы, включая потоковую отдачу."""
+    with CaptureQueriesContext(connection) as context:
+        response = getattr(client, method)(url, data, format="json")
+        if response.streaming:
+            content = b"".join(response.streaming_content)
+        else:
+            content = response.content
+    return response, context.captured_queries, content
+
+
+def check_budget(client, method, url, max_queries, max_bytes,
+                 status=200, data=None):
+    response, queries, content = measure(client, method, url, data)
+    assert response.status_code == status, content[:500]
+    assert len(queries) <= max_queries, (
+        f"{method.upper()} {url}: {len(queries)} запросов "
+        f"при бюджете {max_queries}:\n"
+        + "\n".join(query["sql"] for query in queries)
+    )
+    assert len(content) <= max_bytes, (
+        f"{method.upper()} {url}: ответ {len(content)} байт "
+        f"при бюджете {max_bytes}"
+    )
+    return response, queries
+
+
+@pytest.mark.parametrize(
+    "client_name, template, max_queries, max_bytes", READ_ROUTES
+)
+def test_read_budget(request, dataset, client_name, template,
+                     max_queries, max_bytes):
+    client = request.getfixturevalue(client_name)
+    check_budget(
+        client, "get", get_url(template, dataset), max_queries, max_bytes
+    )
+
+
+@pytest.mark.parametrize(
+    "client_name, template, max_queries, max_bytes", LIST_ROUTES
+)
+def test_list_budget(request, dataset, client_name, template,
+                     max_queries, max_bytes):
+    client = request.getfixturevalue(client_name)
+    # Прогрев кэшей (токен, справочники), чтобы сравнивать одинаковое
+    client.get(get_url(template, dataset, limit=PAGE_SIZES[0]))
+    counts = []
+    for limit in PAGE_SIZES:
+        response, queries = check_budget(
+            client, "get", get_url(template, dataset, limit=limit),
+            max_queries, max_bytes
+        )
+        assert len(response.data["results"]) == limit
+        counts.append(len(queries))
+    assert len(set(counts)) == 1, (
+        f"Количество запросов зависит от размера страницы: {counts}"
+    )
+
+
+def test_expand_budget(anon_client, dataset):
+    check_budget(
+        anon_client, "get", f"/s/{dataset['recipes'][0].id}/",
+        1, 100, status=302
+    )
+
+
+def test_user_create_budget(anon_client, db):
+    check_budget(anon_client, "post", "/api/users/", 5, 200, status=201,
+                 data={
+                     "email": "new@foodgram.ru",
+                     "username": "new",
+                     "first_name": "Новый",
+                     "last_name": "Пользователь",
+                     "password": "Sup3r-secret",
+                 })
+
+
+def test_token_login_logout_budget(anon_client, dataset):
+    response, _ = check_budget(
+        anon_client, "post", "/api/auth/token/login/", 6, 100, data={
+            "email": "reader@foodgram.ru", "password": "password"
+        }
+    )
+    anon_client.credentials(
+        HTTP_AUTHORIZATION=f"Token {response.data['auth_token']}"
+    )
+    check_budget(
+        anon_client, "post", "/api/auth/token/logout/", 3, 100,
+        status=204
+    )
+
+
+def test_set_password_budget(reader_client):
+    check_budget(
+        reader_client, "post", "/api/users/set_password/", 3, 100,
+        status=204, data={
+            "current_password": "password", "new_password": "Sup3r-secret"
+        }
+    )
+
+
+def test_avatar_budget(reader_client):
+    check_budget(
+        reader_client, "put", "/api/users/me/avatar/", 9, 200,
+        data={"avatar": IMAGE}
+    )
+    check_budget(
+        reader_client, "delete", "/api/users/me/avatar/", 6, 100,
+        status=204
+    )
+
+
+def test_subscribe_budget(author_client, dataset):
+    url = f"/api/users/{dataset['authors'][1].id}/subscribe/"
+    check_budget(author_client, "post", url, 8, 200, status=201)
+    check_budget(author_client, "delete", url, 4, 100, status=204)
+
+
+@pytest.mark.parametrize("action, model, post_queries, delete_queries", [
+    ("favorite", UserFavorite, 11, 8),
+    ("shopping_cart", UserShoppingList, 14, 11),
+])
+def test_recipe_relation_budget(reader_client, dataset, action, model,
+                                post_queries, delete_queries):
+    recipe = dataset["recipes"][1]
+    url = f"/api/recipes/{recipe.id}/{action}/"
+    check_budget(reader_client, "post", url, post_queries, 100, status=201)
+    assert model.objects.filter(recipe=recipe).exists()
+    check_budget(
+        reader_client, "delete", url, delete_queries, 100, status=204
+    )
+
+
+def get_recipe_data(dataset, ingredients_count):
+    return {
+        "name": "Новый рецепт",
+        "text": "Описание",
+        "cooking_time": 15,
+        "image": IMAGE,
+        "tags": [tag.id for tag in dataset["tags"][:2]],
+        "ingredients": [
+            {"id": ingredient.id, "amount": 10}
+            for ingredient in dataset["ingredients"][:ingredients_count]
+        ],
+    }
+
+
+@pytest.mark.parametrize("ingredients_count, max_queries", [
+    (2, 17),
+    (6, 17),
+])
+def test_recipe_create_budget(author_client, dataset, ingredients_count,
+                              max_queries):
+    check_budget(
+        author_client, "post", "/api/recipes/", max_queries, 400,
+        status=201, data=get_recipe_data(dataset, ingredients_count)
+    )
+
+
+@pytest.mark.parametrize("ingredients_count, max_queries", [
+    (2, 21),
+    (6, 22),
+])
+def test_recipe_update_budget(author_client, dataset, ingredients_count,
+                              max_queries):
+    check_budget(
+        author_client, "patch",
+        f"/api/recipes/{dataset['recipes'][0].id}/", max_queries, 400,
+        data=get_recipe_data(dataset, ingredients_count)
+    )
+
+
+def test_recipe_delete_budget(author_client, dataset):
+    recipe = dataset["recipes"][0]
+    check_budget(
+        author_client, "delete", f"/api/recipes/{recipe.id}/", 21, 100,
+        status=204
+    )
+    assert not Recipe.objects.filter(id=recipe.id).exists()
@@ -0,0 +1,163 @@
+"""Запись рецепта разницей тегов и ингредиентов."""
+import pytest
+from api.serializers import RecipeCreateUpdateSerializer
+from recipes.models import Recipe, UserFavorite
+from recipes.search import search_recipes
+from recipes.shopping_cart import get_expected_amounts, get_stored_amounts
+
+from tests.test_query_budgets import check_budget, get_recipe_data
+
+
+def get_ingredients(recipe):
+    return dict(
+        recipe.recipeingredients.values_list("ingredient_id", "amount")
+    )
+
+
+def test_update_writes_delta(author_client, dataset):
+    recipe = dataset["recipes"][0]
+    old_ingredients = get_ingredients(recipe)
+    changed_id = next(iter(old_ingredients))
+    payload = [
+        {"id": ingredient_id, "amount": amount}
+        for ingredient_id, amount in old_ingredients.items()
+    ]
+    payload[0]["amount"] += 5
+    # Прогрев кэша токенов
+    author_client.get("/api/users/me/")
+    response, queries = check_budget(
+        author_client, "patch", f"/api/recipes/{recipe.id}/", 10, 400,
+        data={"ingredients": payload}
+    )
+    # Состав и название не менялись: поисковый документ не обновляется
+    assert not [
+        query for query in queries
+        if query["sql"].startswith(("INSERT INTO \"recipes_recipeingr",
+                                    "DELETE FROM \"recipes_recipeingr"))
+        or "recipes_recipe_search" in query["sql"]
+    ]
+    old_ingredients[changed_id] += 5
+    assert get_ingredients(recipe) == old_ingredients
+    assert {
+        item["id"]: item["amount"] for item in response.data["ingredients"]
+    } == old_ingredients
+    assert response.data["tags"] == sorted(
+        recipe.tags.values_list("id", flat=True)
+    )
+    # Рецепт в списке покупок читателя
+    assert get_stored_amounts() == get_expected_amounts()
+
+
+def test_update_without_tags_and_ingredients(author_client, dataset):
+    recipe = dataset["recipes"][0]
+    tags = set(recipe.tags.values_list("id", flat=True))
+    ingredients = get_ingredients(recipe)
+    updated_at = recipe.updated_at
+    response = author_client.patch(
+        f"/api/recipes/{recipe.id}/", {"name": "Переименованный"},
+        format="json"
+    )
+    assert response.status_code == 200, response.data
+    recipe.refresh_from_db()
+    assert recipe.name == "Переименованный"
+    assert recipe.updated_at > updated_at
+    assert set(recipe.tags.values_list("id", flat=True)) == tags
+    assert get_ingredients(recipe) == ingredients
+
+
+def test_unchanged_update_writes_nothing(author_client, dataset):
+    recipe = dataset["recipes"][0]
+    payload = {
+        "name": recipe.name,
+        "tags": list(recipe.tags.values_list("id", flat=True)),
+        "ingredients": [
+            {"id": ingredient_id, "amount": amount}
+            for ingredient_id, amount in get_ingredients(recipe).items()
+        ],
+    }
+    updated_at = Recipe.objects.get(id=recipe.id).updated_at
+    # Прогрев кэша токенов
+    author_client.get("/api/users/me/")
+    _, queries = check_budget(
+        author_client, "patch", f"/api/recipes/{recipe.id}/", 7, 400,
+        data=payload
+    )
+    assert not [
+        query for query in queries
+        if query["sql"].startswith(("INSERT", "UPDATE", "DELETE"))
+    ]
+    assert Recipe.objects.get(id=recipe.id).updated_at == updated_at
+
+
+def test_ingredient_change_updates_search(author_client, dataset):
+    recipe = dataset["recipes"][0]
+    ingredient = dataset["ingredients"][-1]
+    ingredient.name = "шафран"
+    ingredient.save()
+    assert recipe not in search_recipes(Recipe.objects.all(), "шафран")
+    response = author_client.patch(
+        f"/api/recipes/{recipe.id}/",
+        {"ingredients": [{"id": ingredient.id, "amount": 1}]},
+        format="json"
+    )
+    assert response.status_code == 200, response.data
+    assert recipe in search_recipes(Recipe.objects.all(), "шафран")
+
+
+def test_update_replaces_tags_and_ingredients(author_client, dataset):
+    recipe = dataset["recipes"][0]
+    data = get_recipe_data(dataset, 6)
+    data["tags"] = [dataset["tags"][2].id]
+    data["name"] = "Суп с новыми ингредиентами"
+    response = author_client.patch(
+        f"/api/recipes/{recipe.id}/", data, format="json"
+    )
+    assert response.status_code == 200, response.data
+    assert list(recipe.tags.values_list("id", flat=True)) == data["tags"]
+    assert get_ingredients(recipe) == {
+        ingredient["id"]: ingredient["amount"]
+        for ingredient in data["ingredients"]
+    }
+    assert get_stored_amounts() == get_expected_amounts()
+    assert recipe in search_recipes(Recipe.objects.all(), "суп")
+
+
+@pytest.mark.parametrize("field, value", (
+    ("tags", [999]),
+    ("ingredients", [{"id": 999, "amount": 1}]),
+))
+def test_missing_objects_are_rejected(author_client, dataset, field, value):
+    data = get_recipe_data(dataset, 2)
+    data[field] = value
+    response = author_client.post("/api/recipes/", data, format="json")
+    assert response.status_code == 400
+    assert "999" in str(response.data[field])
+    assert not Recipe.objects.filter(name=data["name"]).exists()
+
+
+def test_update_keeps_favorites_count(author_client, dataset, monkeypatch):
+    recipe = dataset["recipes"][0]
+    favorites_count = Recipe.objects.get(id=recipe.id).favorites_count
+    validate_tags = RecipeCreateUpdateSerializer.validate_tags
+
+    def favorite_during_update(tags):
+        # Рецепт уже загружен представлением, счетчик меняется
+        # параллельным запросом до сохранения
+        UserFavorite.objects.create(
+            user=dataset["authors"][1], recipe_id=recipe.id
+        )
+        return validate_tags(tags)
+
+    monkeypatch.setattr(
+        RecipeCreateUpdateSerializer, "validate_tags",
+        staticmethod(favorite_during_update)
+    )
+    response = author_client.patch(
+        f"/api/recipes/{recipe.id}/",
+        {"name": "Новое название", "tags": [dataset["tags"][0].id]},
+        format="json"
+    )
+    assert response.status_code == 200, response.data
+    assert Recipe.objects.get(id=recipe.id).favorites_count == (
+        favorites_count + 1
+    )
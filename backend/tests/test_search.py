@@ -0,0 +1,42 @@
+"""Полнотекстовый поиск рецептов."""
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from recipes.models import Recipe
+from recipes.search import (SEARCH_TABLE, search_recipes,
+                            update_search_documents)
+
+
+def test_search_ignores_cursor_pagination(anon_client, dataset):
+    recipes = dataset["recipes"]
+    # Старый рецепт с совпадением в названии выше нового с совпадением
+    # в описании
+    Recipe.objects.filter(id=recipes[-1].id).update(name="Борщ")
+    Recipe.objects.filter(id=recipes[0].id).update(text="Почти борщ")
+    update_search_documents((recipes[0].id, recipes[-1].id))
+
+    response = anon_client.get("/api/recipes/?search=борщ&pagination=cursor")
+    assert response.status_code == 200
+    assert response.data["count"] == 2
+    assert [recipe["id"] for recipe in response.data["results"]] == [
+        recipes[-1].id, recipes[0].id
+    ]
+
+
+def test_rebuild_fills_empty_index_once(dataset):
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+    with CaptureQueriesContext(connection) as context:
+        call_command("rebuild_search_index")
+    inserts = [
+        query for query in context.captured_queries
+        if query["sql"].startswith(f"INSERT INTO {SEARCH_TABLE}")
+    ]
+    assert len(inserts) == 1
+    assert not [
+        query for query in context.captured_queries
+        if query["sql"].startswith(f"DELETE FROM {SEARCH_TABLE}")
+    ]
+    assert search_recipes(Recipe.objects.all(), "рецепт").count() == len(
+        dataset["recipes"]
+    )
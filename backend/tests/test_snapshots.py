@@ -0,0 +1,42 @@
+"""Снимки справочников: ETag сжатого и несжатого ответа."""
+from api.snapshots import tags_snapshot
+
+URL = "/api/tags/"
+
+
+def test_etag_depends_on_encoding(anon_client, dataset):
+    plain = anon_client.get(URL)
+    compressed = anon_client.get(URL, HTTP_ACCEPT_ENCODING="gzip")
+    assert compressed["Content-Encoding"] == "gzip"
+    assert plain["ETag"] != compressed["ETag"]
+    assert anon_client.get(
+        URL, HTTP_IF_NONE_MATCH=plain["ETag"]
+    ).status_code == 304
+    assert anon_client.get(
+        URL, HTTP_IF_NONE_MATCH=compressed["ETag"],
+        HTTP_ACCEPT_ENCODING="gzip"
+    ).status_code == 304
+    # Сжатое тело не подтверждается ETag несжатого и наоборот
+    assert anon_client.get(
+        URL, HTTP_IF_NONE_MATCH=plain["ETag"], HTTP_ACCEPT_ENCODING="gzip"
+    ).status_code == 200
+    assert anon_client.get(
+        URL, HTTP_IF_NONE_MATCH=compressed["ETag"]
+    ).status_code == 200
+
+
+def test_weak_etag_matches(anon_client, dataset):
+    etag = anon_client.get(URL)["ETag"]
+    assert anon_client.get(
+        URL, HTTP_IF_NONE_MATCH=f"W/{etag}"
+    ).status_code == 304
+
+
+def test_invalidate_changes_etag(anon_client, dataset):
+    etag = anon_client.get(URL)["ETag"]
+    dataset["tags"][0].name = "Новый тег"
+    dataset["tags"][0].save()
+    tags_snapshot.invalidate()
+    response = anon_client.get(URL, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response["ETag"] != etag
@@ -0,0 +1,105 @@
+"""Загрузка картинок файлом в multipart/form-data."""
+from base64 import b64encode
+from io import BytesIO
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+from recipes.models import Recipe
+
+from tests.test_query_budgets import IMAGE, get_recipe_data
+
+
+def make_upload(size=(40, 30), image_format="PNG", name="photo.png"):
+    buffer = BytesIO()
+    Image.new("RGB", size, "orange").save(buffer, image_format)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+
+
+def get_multipart_recipe_data(dataset):
+    """Вложенные ингредиенты — в нотации HTML-форм DRF."""
+    data = get_recipe_data(dataset, 2)
+    data["image"] = make_upload(name="photo.jpg", image_format="JPEG")
+    for index, ingredient in enumerate(data.pop("ingredients")):
+        data[f"ingredients[{index}]id"] = ingredient["id"]
+        data[f"ingredients[{index}]amount"] = ingredient["amount"]
+    return data
+
+
+def test_avatar_multipart(reader_client, dataset):
+    response = reader_client.put(
+        "/api/users/me/avatar/", {"avatar": make_upload()},
+        format="multipart"
+    )
+    assert response.status_code == 200, response.data
+    reader = dataset["reader"]
+    reader.refresh_from_db()
+    assert reader.avatar.name.endswith(".png")
+    with reader.avatar.open() as avatar:
+        assert Image.open(avatar).size == (40, 30)
+
+
+def test_recipe_multipart_create_and_update(author_client, dataset):
+    response = author_client.post(
+        "/api/recipes/", get_multipart_recipe_data(dataset),
+        format="multipart"
+    )
+    assert response.status_code == 201, response.data
+    recipe = Recipe.objects.get(id=response.data["id"])
+    assert recipe.image.name.endswith(".jpg")
+    assert recipe.recipeingredients.count() == 2
+    assert recipe.tags.count() == 2
+
+    data = get_multipart_recipe_data(dataset)
+    data["image"] = make_upload((50, 50), "JPEG", "other.jpg")
+    response = author_client.patch(
+        f"/api/recipes/{recipe.id}/", data, format="multipart"
+    )
+    assert response.status_code == 200, response.data
+    recipe.refresh_from_db()
+    with recipe.image.open() as image:
+        assert Image.open(image).size == (50, 50)
+
+
+def test_base64_still_accepted(reader_client):
+    response = reader_client.put(
+        "/api/users/me/avatar/", {"avatar": IMAGE}, format="json"
+    )
+    assert response.status_code == 200
+
+
+def test_too_large_upload_is_aborted(reader_client, settings):
+    settings.IMAGE_UPLOAD_MAX_SIZE = 1024
+    upload = make_upload((300, 300), "BMP", "photo.bmp")
+    response = reader_client.put(
+        "/api/users/me/avatar/", {"avatar": upload}, format="multipart"
+    )
+    assert response.status_code == 413
+
+
+@pytest.mark.parametrize("data_format", ("multipart", "json"))
+def test_too_many_pixels(reader_client, settings, data_format):
+    settings.IMAGE_MAX_PIXELS = 1000
+    upload = make_upload((100, 100))
+    if data_format == "json":
+        upload = "data:image/png;base64," + b64encode(upload.read()).decode()
+    response = reader_client.put(
+        "/api/users/me/avatar/", {"avatar": upload}, format=data_format
+    )
+    assert response.status_code == 400
+    assert "100x100" in str(response.data["avatar"])
+
+
+def test_too_large_upload_outside_api(client, db, settings):
+    # Админка загружает файлы обработчиками Django, без UploadTooLarge
+    settings.IMAGE_UPLOAD_MAX_SIZE = 1024
+    upload = make_upload((300, 300), "BMP", "photo.bmp")
+    response = client.post(
+        "/admin/login/", {"username": "x", "password": "y", "file": upload}
+    )
+    assert response.status_code < 500
@@ -142,7 +142,7 @@ class Api {
           .join("")
       : "";
     return fetch(
-      `/api/recipes/?page=${page}&limit=${limit}${
+      `/api/recipes/?page=${page}&limit=${limit}&image_size=card&image_format=webp${
         author ? `&author=${author}` : ""
       }${is_favorited ? `&is_favorited=${is_favorited}` : ""}${
         is_in_shopping_cart ? `&is_in_shopping_cart=${is_in_shopping_cart}` : ""
@@ -278,7 +278,7 @@ class Api {
   getSubscriptions({ page, limit = 6, recipes_limit = 3 }) {
     const token = localStorage.getItem("token");
     return fetch(
-      `/api/users/subscriptions/?page=${page}&limit=${limit}&recipes_limit=${recipes_limit}`,
+      `/api/users/subscriptions/?page=${page}&limit=${limit}&recipes_limit=${recipes_limit}&image_size=thumb&image_format=webp`,
       {
         method: "GET",
         headers: {